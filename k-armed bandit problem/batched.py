@@ -0,0 +1,187 @@
+import time
+import numpy as np
+from metrics import FullMetrics
+
+
+class GaussianBandit:
+    def __init__(self, count_runs, amount_arms=10, seed=None, initial_balance=None):
+        self.count_runs = count_runs
+        self.amount_arms = amount_arms
+        self.rng = np.random.default_rng(seed)
+        self.means = self.rng.normal(0, 1, (count_runs, amount_arms))
+        self.initial_balance = initial_balance
+        self.rows = np.arange(count_runs)
+        self.balances = None
+
+    def get_best_arms(self):
+        return np.argmax(self.means, axis=1)
+
+    def reset(self):
+        self.balances = np.zeros(self.count_runs) + (self.initial_balance or 0)
+        return self.balances.copy()
+
+    def sample_rewards(self, actions):
+        return self.rng.normal(self.means[self.rows, actions], 1)
+
+    def step(self, actions):
+        rewards = self.sample_rewards(actions)
+        self.balances += rewards
+        if self.initial_balance is None:
+            dones = np.zeros(self.count_runs, dtype=bool)
+        else:
+            dones = self.balances <= 0
+        return self.balances.copy(), rewards, dones, {}
+
+
+class BernoulliBandit(GaussianBandit):
+    def __init__(self, count_runs, amount_arms=10, seed=None, initial_balance=None):
+        super().__init__(count_runs, amount_arms, seed, initial_balance)
+        self.means = self.rng.random((count_runs, amount_arms))
+
+    def sample_rewards(self, actions):
+        return (self.rng.random(self.count_runs) < self.means[self.rows, actions]).astype(float)
+
+
+class GymBandit:
+    def __init__(self, env, amount_arms):
+        self.env = env
+        self.count_runs = 1
+        self.amount_arms = amount_arms
+
+    def get_best_arms(self):
+        return np.array([self.env.get_best_arm()])
+
+    def reset(self):
+        return np.array([self.env.reset()])
+
+    def step(self, actions):
+        balance, reward, done, info = self.env.step(int(actions[0]))
+        return np.array([balance]), np.array([reward], dtype=float), np.array([done]), info
+
+
+LOCAL_BANDITS = {'local': GaussianBandit, 'local-bernoulli': BernoulliBandit}
+
+
+class BatchedEpsGreedy:
+    def __init__(self, count_runs, amount_arms, eps, q_init_value):
+        self.eps = np.broadcast_to(np.asarray(eps, dtype=float), (count_runs,))
+        self.Q = np.zeros((count_runs, amount_arms)) + np.asarray(q_init_value, dtype=float).reshape(-1, 1)
+        self.N = np.zeros((count_runs, amount_arms))
+
+    def select(self, rng):
+        count_runs, amount_arms = self.Q.shape
+        explore = rng.random(count_runs) < self.eps
+        return np.where(explore, rng.integers(0, amount_arms, count_runs), np.argmax(self.Q, axis=1))
+
+    def update(self, rows, actions, rewards):
+        self.N[rows, actions] += 1
+        self.Q[rows, actions] += (rewards - self.Q[rows, actions]) / self.N[rows, actions]
+
+
+class BatchedUCB:
+    def __init__(self, count_runs, amount_arms, c=2.0):
+        self.c = c
+        self.Q = np.zeros((count_runs, amount_arms))
+        self.N = np.zeros((count_runs, amount_arms))
+
+    def select(self, rng):
+        t = self.N.sum(axis=1, keepdims=True) + 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            upper_bounds = self.Q + self.c * np.sqrt(np.log(t) / self.N)
+        upper_bounds[self.N == 0] = np.inf
+        return np.argmax(upper_bounds, axis=1)
+
+    def update(self, rows, actions, rewards):
+        self.N[rows, actions] += 1
+        self.Q[rows, actions] += (rewards - self.Q[rows, actions]) / self.N[rows, actions]
+
+
+class BatchedGradient:
+    def __init__(self, count_runs, amount_arms, alpha=0.1, baseline=True):
+        self.alpha = alpha
+        self.baseline = baseline
+        self.H = np.zeros((count_runs, amount_arms))
+        self.N = np.zeros((count_runs, amount_arms))
+        self.pi = np.full((count_runs, amount_arms), 1 / amount_arms)
+        self.mean_rewards = np.zeros(count_runs)
+        self.steps = np.zeros(count_runs)
+
+    def select(self, rng):
+        preferences = np.exp(self.H - self.H.max(axis=1, keepdims=True))
+        self.pi = preferences / preferences.sum(axis=1, keepdims=True)
+        u = rng.random(len(self.H))
+        actions = np.sum(np.cumsum(self.pi, axis=1) < u[:, None], axis=1)
+        return np.minimum(actions, self.H.shape[1] - 1)
+
+    def update(self, rows, actions, rewards):
+        self.N[rows, actions] += 1
+        self.steps[rows] += 1
+        self.mean_rewards[rows] += (rewards - self.mean_rewards[rows]) / self.steps[rows]
+        advantages = rewards - self.mean_rewards[rows] if self.baseline else rewards
+        self.H[rows] -= self.alpha * advantages[:, None] * self.pi[rows]
+        self.H[rows, actions] += self.alpha * advantages
+
+
+class BatchedThompson:
+    def __init__(self, count_runs, amount_arms, prior='gaussian'):
+        if prior not in ('gaussian', 'beta'):
+            raise ValueError(f'Unknown prior "{prior}".')
+        self.prior = prior
+        self.N = np.zeros((count_runs, amount_arms))
+        self.sums = np.zeros((count_runs, amount_arms))
+
+    def select(self, rng):
+        if self.prior == 'beta':
+            samples = rng.beta(1 + self.sums, 1 + self.N - self.sums)
+        else:
+            samples = rng.normal(self.sums / (self.N + 1), 1 / np.sqrt(self.N + 1))
+        return np.argmax(samples, axis=1)
+
+    def update(self, rows, actions, rewards):
+        if self.prior == 'beta' and np.any((rewards != 0) & (rewards != 1)):
+            raise ValueError('Beta prior requires 0/1 rewards.')
+        self.N[rows, actions] += 1
+        self.sums[rows, actions] += rewards
+
+
+STRATEGIES = {
+    'eps_greedy': BatchedEpsGreedy,
+    'ucb': BatchedUCB,
+    'gradient': BatchedGradient,
+    'thompson': BatchedThompson,
+}
+
+
+def simulate(bandit, agent, count_iter, seed=None, metrics=None):
+    if metrics is None:
+        metrics = FullMetrics(bandit.count_runs, count_iter)
+    rng = np.random.default_rng(seed)
+    best_arms = bandit.get_best_arms()
+    lengths = np.zeros(bandit.count_runs, dtype=np.int64)
+    alive = np.ones(bandit.count_runs, dtype=bool)
+    rows = np.arange(bandit.count_runs)
+    bandit.reset()
+    for t in range(count_iter):
+        start_time = time.perf_counter()
+        actions = agent.select(rng)
+        step_time = time.perf_counter() - start_time
+        step_balances, step_rewards, dones, _ = bandit.step(actions)
+        if not alive.all():
+            rows = np.flatnonzero(alive)
+            actions, step_rewards = actions[rows], step_rewards[rows]
+            step_balances, dones = step_balances[rows], dones[rows]
+        start_time = time.perf_counter()
+        agent.update(rows, actions, step_rewards)
+        step_time += time.perf_counter() - start_time
+        metrics.update(t, rows, step_rewards, step_balances, actions == best_arms[rows], step_time)
+        lengths[rows] += 1
+        alive[rows[dones]] = False
+        if not alive.any():
+            break
+    metrics.close()
+    return metrics, agent.N, lengths
+
+
+def batched_eps_greedy(bandit, eps, q_init_value, count_iter, seed=None, metrics=None):
+    agent = BatchedEpsGreedy(bandit.count_runs, bandit.amount_arms, eps, q_init_value)
+    return simulate(bandit, agent, count_iter, seed, metrics)
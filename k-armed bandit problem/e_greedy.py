@@ -1,9 +1,11 @@
 import numpy as np
 import random
 import gym
-import pandas as pd
-import matplotlib.pyplot as plt
 import os
+import multiprocessing
+from batched import LOCAL_BANDITS, STRATEGIES, BatchedEpsGreedy, GymBandit, simulate
+from metrics import StreamingMetrics, masked_mean
+from storage import save_runs
 
 
 def eps_greedy_alg(env, amount_arms, eps, q_init_value, count_iter):
@@ -33,57 +35,126 @@ def eps_greedy_alg(env, amount_arms, eps, q_init_value, count_iter):
 
 
 class Experiment:
-    def __init__(self, env_type, eps, q_init_value, count_iter):
+    def __init__(self, env_type, eps, q_init_value, count_iter, amount_arms=10, strategy='eps_greedy',
+                 strategy_params=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown strategy "{strategy}".')
+        if strategy == 'thompson' and (strategy_params or {}).get('prior') == 'beta' and env_type != 'local-bernoulli':
+            raise ValueError('Thompson sampling with beta prior requires 0/1 rewards (env_type="local-bernoulli").')
         self.env_type = env_type
         self.eps = eps
         self.q_init_values = q_init_value
         self.count_iter = count_iter
+        self.amount_arms = amount_arms
+        self.strategy = strategy
+        self.strategy_params = strategy_params or {}
+        self.mean_step_time = None
+
+    def make_agent(self, count_runs):
+        if self.strategy == 'eps_greedy':
+            return BatchedEpsGreedy(count_runs, self.amount_arms, self.eps, self.q_init_values)
+        return STRATEGIES[self.strategy](count_runs, self.amount_arms, **self.strategy_params)
 
     def run(self, env):
-        rewards, balance, accuracy, arm_n = eps_greedy_alg(env, amount_arms=10, eps=self.eps,
+        rewards, balance, accuracy, arm_n = eps_greedy_alg(env, amount_arms=self.amount_arms, eps=self.eps,
                                                            q_init_value=self.q_init_values, count_iter=self.count_iter)
         rewards = np.cumsum(rewards) / np.arange(1, len(rewards) + 1)
         accuracy = np.cumsum(accuracy) / np.arange(1, len(accuracy) + 1)
         return rewards, balance, accuracy, arm_n
 
+    def get_metadata(self, count_runs, **kwargs):
+        return dict(env_type=self.env_type, eps=self.eps, q_init_value=self.q_init_values, count_iter=self.count_iter,
+                    amount_arms=self.amount_arms, strategy=self.strategy, strategy_params=self.strategy_params,
+                    count_runs=count_runs, **kwargs)
+
     @staticmethod
-    def save_experiment(path2save, runs_rewards, runs_balances, runs_accuracy, count_runs):
-        if not os.path.isdir(path2save):
-            os.makedirs(path2save)
+    def save_experiment(path2save, runs_rewards, runs_balances, runs_accuracy, mask, count_runs, metadata=None,
+                        compress=False):
+        save_runs(path2save, {
+            'rewards': runs_rewards,
+            'balances': runs_balances,
+            'accuracy': runs_accuracy,
+            'lengths': mask.sum(axis=0),
+        }, dict(metadata or {'count_runs': count_runs}, count_rows=len(runs_rewards)), compress=compress)
+
+    def run_batch(self, count_runs, seed=0, env=None):
+        if env is None:
+            bandit = LOCAL_BANDITS[self.env_type](count_runs, self.amount_arms, seed=seed)
+        else:
+            bandit = GymBandit(env, self.amount_arms)
+        metrics, arm_n, lengths = simulate(bandit, self.make_agent(count_runs), count_iter=self.count_iter, seed=seed)
+        self.mean_step_time = metrics.mean_step_time
+        steps = np.arange(1, self.count_iter + 1)[:, None]
+        return (np.cumsum(metrics.rewards, axis=0) / steps, metrics.balances, np.cumsum(metrics.accuracy, axis=0) / steps,
+                arm_n, lengths)
+
+    def get_path(self, exp_name, count_runs):
+        return os.path.join('experiments', f'{exp_name}_{count_runs}_{self.count_iter}')
 
-        runs_rewards.to_csv(os.path.join(path2save, 'reward.csv'), index=False)
-        runs_balances.to_csv(os.path.join(path2save, 'balance.csv'), index=False)
-        runs_accuracy.to_csv(os.path.join(path2save, 'acc.csv'), index=False)
+    def stream(self, exp_name, count_runs, checkpoint_every=None, save=True, seed=0):
+        if self.env_type not in LOCAL_BANDITS:
+            raise ValueError(f'Streaming mode works only with local env types {list(LOCAL_BANDITS)}.')
+        path = self.get_path(exp_name, count_runs) if save else None
+        bandit = LOCAL_BANDITS[self.env_type](count_runs, self.amount_arms, seed=seed)
+        metrics = StreamingMetrics(count_runs, self.count_iter, checkpoint_every=checkpoint_every, path=path)
+        simulate(bandit, self.make_agent(count_runs), count_iter=self.count_iter, seed=seed, metrics=metrics)
+        self.mean_step_time = metrics.mean_step_time
+        if path is not None:
+            checkpoints = [f'{StreamingMetrics.CHECKPOINT_PREFIX}{name}' for name in metrics.checkpoints]
+            final_columns = {f'final_{name}': getattr(metrics, name) for name in StreamingMetrics.NAMES}
+            save_runs(path, dict(final_columns, lengths=metrics.lengths), self.get_metadata(
+                count_runs, seed=seed, streamed=True, checkpoint_every=checkpoint_every, checkpoints=checkpoints,
+                mean_step_time=self.mean_step_time
+            ), written_columns=checkpoints)
+        return metrics
 
-        plt.figure(figsize=(15, 10))
-        runs_accuracy.mean(axis=1).plot(title=f'Кумулятивная точность, кол-во запусков: {count_runs}')
-        plt.savefig(os.path.join(path2save, 'acc.png'))
-        plt.figure(figsize=(15, 10))
-        runs_rewards.mean(axis=1).plot(title=f'Кумулятивная средняя награда, кол-во запусков: {count_runs}')
-        plt.savefig(os.path.join(path2save, 'mean_reward.png'))
-        plt.figure(figsize=(15, 10))
-        runs_balances.mean(axis=1).plot(title=f'Баланс, кол-во запусков: {count_runs}')
-        plt.savefig(os.path.join(path2save, 'mean_balance.png'))
+    def run_seed(self, seed):
+        if self.env_type in LOCAL_BANDITS or self.strategy != 'eps_greedy':
+            env = None if self.env_type in LOCAL_BANDITS else gym.make(self.env_type, seed=seed)
+            rewards, balances, accuracy, arm_n, lengths = self.run_batch(1, seed, env=env)
+            length = lengths[0]
+            return rewards[:length, 0], balances[:length, 0], accuracy[:length, 0], arm_n[0]
+        env = gym.make(self.env_type, seed=seed)
+        np.random.seed(0)
+        random.seed(0)
+        return self.run(env)
 
-    def __call__(self, exp_name, count_runs, save=True):
-        runs_rewards = pd.DataFrame()
-        runs_balances = pd.DataFrame()
-        runs_accuracy = pd.DataFrame()
-        arm_bar = pd.DataFrame()
-        # env = gym.make(self.env_type, seed=0)
-        for i in range(count_runs):
-            env = gym.make(self.env_type, seed=i)
-            np.random.seed(0)
-            random.seed(0)
-            rewards, balances, accuracy, arm_n = self.run(env)
-            runs_rewards.loc[:len(rewards)-1, i] = rewards
-            runs_balances.loc[:len(balances)-1, i] = balances
-            runs_accuracy.loc[:len(accuracy)-1, i] = accuracy
-            arm_bar.loc[:, i] = arm_n
+    def __call__(self, exp_name, count_runs, save=True, processes=1, vectorized=False, compress=False):
+        processes = processes or multiprocessing.cpu_count()
+        if vectorized:
+            if self.env_type not in LOCAL_BANDITS:
+                raise ValueError(f'Vectorized mode works only with local env types {list(LOCAL_BANDITS)}.')
+            runs_rewards, runs_balances, runs_accuracy, _, runs_lengths = self.run_batch(count_runs)
+        else:
+            if processes == 1:
+                runs = map(self.run_seed, range(count_runs))
+            else:
+                with multiprocessing.Pool(processes) as pool:
+                    runs = pool.map(self.run_seed, range(count_runs), chunksize=max(1, count_runs // (4 * processes)))
+            runs_rewards = np.zeros((self.count_iter, count_runs))
+            runs_balances = np.zeros((self.count_iter, count_runs))
+            runs_accuracy = np.zeros((self.count_iter, count_runs))
+            runs_lengths = np.zeros(count_runs, dtype=np.int64)
+            for i, (rewards, balances, accuracy, _) in enumerate(runs):
+                runs_lengths[i] = len(rewards)
+                runs_rewards[:len(rewards), i] = rewards
+                runs_balances[:len(balances), i] = balances
+                runs_accuracy[:len(accuracy), i] = accuracy
+        max_length = runs_lengths.max()
+        mask = np.arange(max_length)[:, None] < runs_lengths[None, :]
+        runs_rewards, runs_balances, runs_accuracy = (
+            runs_rewards[:max_length], runs_balances[:max_length], runs_accuracy[:max_length]
+        )
         if save:
-            self.save_experiment(path2save=os.path.join('experiments', f'{exp_name}_{count_runs}_{self.count_iter}'),
+            self.save_experiment(path2save=self.get_path(exp_name, count_runs),
                                  runs_rewards=runs_rewards,
                                  runs_accuracy=runs_accuracy,
                                  runs_balances=runs_balances,
-                                 count_runs=count_runs)
-        return runs_rewards.mean(axis=1), runs_accuracy.mean(axis=1), runs_balances.mean(axis=1)
+                                 mask=mask,
+                                 count_runs=count_runs,
+                                 metadata=self.get_metadata(
+                                     count_runs, **({'seed': 0, 'mean_step_time': self.mean_step_time} if vectorized
+                                                     else {'run_seeds': [0, count_runs]})
+                                 ),
+                                 compress=compress)
+        return masked_mean(runs_rewards, mask), masked_mean(runs_accuracy, mask), masked_mean(runs_balances, mask)
@@ -0,0 +1,88 @@
+import os
+import numpy as np
+
+
+def masked_mean(values, mask):
+    return np.sum(values, axis=1, where=mask) / mask.sum(axis=1)
+
+
+class FullMetrics:
+    def __init__(self, count_runs, count_iter):
+        self.rewards = np.zeros((count_iter, count_runs))
+        self.balances = np.zeros((count_iter, count_runs))
+        self.accuracy = np.zeros((count_iter, count_runs))
+        self.step_times = np.zeros(count_iter)
+        self.steps = 0
+
+    def update(self, t, rows, rewards, balances, correct, step_time):
+        self.rewards[t, rows] = rewards
+        self.balances[t, rows] = balances
+        self.accuracy[t, rows] = correct
+        self.step_times[t] = step_time
+        self.steps = t + 1
+
+    @property
+    def mean_step_time(self):
+        return float(np.mean(self.step_times[:self.steps])) if self.steps else 0.0
+
+    def close(self):
+        self.step_times = self.step_times[:self.steps]
+
+
+class StreamingMetrics:
+    NAMES = ('mean_rewards', 'accuracy', 'balances')
+    CHECKPOINT_PREFIX = 'checkpoints_'
+
+    def __init__(self, count_runs, count_iter, checkpoint_every=None, path=None):
+        self.reward_sums = np.zeros(count_runs)
+        self.correct = np.zeros(count_runs)
+        self.balances = np.zeros(count_runs)
+        self.lengths = np.zeros(count_runs, dtype=np.int64)
+        self.total_time = 0.0
+        self.steps = 0
+        self.checkpoint_every = checkpoint_every
+        self.path = path
+        self.checkpoints = {}
+        if checkpoint_every:
+            shape = (count_iter // checkpoint_every, count_runs)
+            if path is not None:
+                os.makedirs(path, exist_ok=True)
+            for name in self.NAMES:
+                if path is None:
+                    self.checkpoints[name] = np.zeros(shape)
+                else:
+                    self.checkpoints[name] = np.lib.format.open_memmap(
+                        os.path.join(path, f'{self.CHECKPOINT_PREFIX}{name}.npy'), mode='w+', dtype=np.float64,
+                        shape=shape
+                    )
+
+    @property
+    def mean_rewards(self):
+        return self.reward_sums / np.maximum(self.lengths, 1)
+
+    @property
+    def accuracy(self):
+        return self.correct / np.maximum(self.lengths, 1)
+
+    @property
+    def mean_step_time(self):
+        return self.total_time / max(self.steps, 1)
+
+    def update(self, t, rows, rewards, balances, correct, step_time):
+        self.reward_sums[rows] += rewards
+        self.correct[rows] += correct
+        self.balances[rows] = balances
+        self.lengths[rows] += 1
+        self.total_time += step_time
+        self.steps = t + 1
+        if self.checkpoint_every and self.steps % self.checkpoint_every == 0:
+            checkpoint_index = self.steps // self.checkpoint_every - 1
+            for name in self.NAMES:
+                self.checkpoints[name][checkpoint_index] = getattr(self, name)
+
+    def close(self):
+        count_checkpoints = self.steps // self.checkpoint_every if self.checkpoint_every else 0
+        for name, checkpoints in self.checkpoints.items():
+            if isinstance(checkpoints, np.memmap):
+                checkpoints.flush()
+            self.checkpoints[name] = checkpoints[:count_checkpoints]
@@ -0,0 +1,66 @@
+import os
+import multiprocessing
+import numpy as np
+from metrics import masked_mean
+from storage import load_column, load_mask, load_metadata
+
+EXPERIMENT_PLOTS = (
+    ('accuracy', 'checkpoints_accuracy', 'acc.png', 'Кумулятивная точность, кол-во запусков: {count_runs}'),
+    ('rewards', 'checkpoints_mean_rewards', 'mean_reward.png',
+     'Кумулятивная средняя награда, кол-во запусков: {count_runs}'),
+    ('balances', 'checkpoints_balances', 'mean_balance.png', 'Баланс, кол-во запусков: {count_runs}'),
+)
+
+
+def get_pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def plot_experiment(path):
+    metadata = load_metadata(path)
+    columns = set(metadata.get('columns', ()))
+    if all(column in columns for column, _, _, _ in EXPERIMENT_PLOTS):
+        column_index = 0
+        mask = load_mask(path)
+        steps = np.arange(1, len(mask) + 1)
+    elif all(column in columns for _, column, _, _ in EXPERIMENT_PLOTS):
+        column_index = 1
+        count_checkpoints = len(load_column(path, EXPERIMENT_PLOTS[0][1]))
+        steps = np.arange(1, count_checkpoints + 1) * metadata['checkpoint_every']
+        mask = steps[:, None] <= np.asarray(load_column(path, 'lengths'))[None, :]
+    else:
+        return False
+    plt = get_pyplot()
+    for plot in EXPERIMENT_PLOTS:
+        file_name, title = plot[2:]
+        figure = plt.figure(figsize=(15, 10))
+        plt.plot(steps, masked_mean(load_column(path, plot[column_index]), mask))
+        plt.title(title.format(count_runs=metadata['count_runs']))
+        figure.savefig(os.path.join(path, file_name))
+        plt.close(figure)
+    return True
+
+
+def plot_curves(curves, title, file_name):
+    plt = get_pyplot()
+    figure = plt.figure()
+    for label, values in curves.items():
+        plt.plot(values, label=label)
+    plt.title(title)
+    plt.legend()
+    figure.savefig(file_name)
+    plt.close(figure)
+
+
+def plot_experiments(paths):
+    for path in paths:
+        plot_experiment(path)
+
+
+def plot_in_background(paths):
+    process = multiprocessing.Process(target=plot_experiments, args=(list(paths),))
+    process.start()
+    return process
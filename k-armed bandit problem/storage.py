@@ -0,0 +1,52 @@
+import os
+import json
+import numpy as np
+
+METADATA_FILE = 'metadata.json'
+COMPRESSED_FILE = 'runs.npz'
+
+
+def save_runs(path, columns, metadata, compress=False, written_columns=()):
+    os.makedirs(path, exist_ok=True)
+    if compress:
+        np.savez_compressed(os.path.join(path, COMPRESSED_FILE), **columns)
+    else:
+        for name, values in columns.items():
+            np.save(os.path.join(path, f'{name}.npy'), values)
+    metadata = dict(metadata, columns=sorted([*columns, *written_columns]), compressed=compress)
+    with open(os.path.join(path, METADATA_FILE), 'w') as file:
+        json.dump(metadata, file, indent=2, default=str)
+
+
+def load_metadata(path):
+    with open(os.path.join(path, METADATA_FILE)) as file:
+        return json.load(file)
+
+
+def load_column(path, name, mmap_mode='r'):
+    if os.path.isfile(os.path.join(path, f'{name}.npy')):
+        return np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+    with np.load(os.path.join(path, COMPRESSED_FILE)) as columns:
+        return columns[name]
+
+
+def load_mask(path):
+    lengths = np.asarray(load_column(path, 'lengths'))
+    count_rows = load_metadata(path).get('count_rows', int(lengths.max(initial=0)))
+    return np.arange(count_rows)[:, None] < lengths[None, :]
+
+
+def find_experiments(root='experiments', **filters):
+    paths = []
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        path = os.path.join(root, name)
+        if not os.path.isfile(os.path.join(path, METADATA_FILE)):
+            continue
+        metadata = load_metadata(path)
+        if all(metadata.get(key) == value for key, value in filters.items()):
+            paths.append(path)
+    return paths
+
+
+def load_column_many(paths, name, mmap_mode='r'):
+    return [(load_metadata(path), load_column(path, name, mmap_mode)) for path in paths]
@@ -4,6 +4,7 @@ from .actions import Actions, ActionSetNames
 from .states import States, StateSetNames, BaseStates
 # Import maps
 from .maps import Maps, MapNames
+from .generated_maps import GeneratedMaps, GeneratedMapParams
 # Import render modes
 from .render_params import RenderModes, RenderObjectTypes
 # Import environment params
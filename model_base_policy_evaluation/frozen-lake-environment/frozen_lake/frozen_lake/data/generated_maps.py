@@ -0,0 +1,135 @@
+"""
+Generated maps data
+"""
+
+# For work with map cache directory
+import os
+# For parse generated map names
+import re
+# For atomic write of map files
+import tempfile
+
+# For work with map grids
+import numpy as np
+
+# Import state values
+from .states import BaseStates
+
+
+class GeneratedMapParams(object):
+    """ Generated maps params """
+    # Generated map name template: gen-<rows>x<columns>-p<hole probability>-s<seed>
+    NAME_TEMPLATE = 'gen-{amount_rows}x{amount_columns}-p{hole_probability}-s{seed}'
+    # (hole probability is formatted by str, so small probabilities have exponent, e.g. p1e-05)
+    NAME_PATTERN = re.compile(r'^gen-(\d+)x(\d+)-p(\d*\.?\d+(?:e[-+]?\d+)?)-s(\d+)$')
+    # Increment when generation logic changes (invalidates maps saved on disk)
+    VERSION = 1
+    # Directory for generated maps (empty string - keep maps only in memory)
+    CACHE_DIR = os.environ.get(
+        'FROZEN_LAKE_MAP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'frozen_lake', 'maps')
+    )
+
+
+class GeneratedMaps(object):
+    """
+    Seeded procedural maps
+    (maps are uint8 grids of state value codes, start state is top left and goal is bottom right,
+    a random monotone path from start to goal is always frozen so the goal is reachable)
+    """
+    # Maps in memory - dict[map name, grid]
+    maps = {}
+
+    @staticmethod
+    def get_name(amount_rows, amount_columns, hole_probability, seed):
+        # type: (int, int, float, int) -> str
+        """ Get generated map name by generation params """
+        return GeneratedMapParams.NAME_TEMPLATE.format(
+            amount_rows=amount_rows, amount_columns=amount_columns, hole_probability=hole_probability, seed=seed
+        )
+
+    @staticmethod
+    def parse_name(map_name):
+        # type: (str) -> Optional[tuple]
+        """
+        Parse generated map name
+        :param map_name: Str, map name
+        :return: Tuple or None, (amount rows, amount columns, hole probability, seed) or None if it is not generated map
+        """
+        match = GeneratedMapParams.NAME_PATTERN.match(map_name)
+        if match is None:
+            return None
+        amount_rows, amount_columns, hole_probability, seed = match.groups()
+        return int(amount_rows), int(amount_columns), float(hole_probability), int(seed)
+
+    @staticmethod
+    def is_generated(map_name):
+        # type: (str) -> bool
+        """ Check is map name defines generated map """
+        return GeneratedMaps.parse_name(map_name) is not None
+
+    @staticmethod
+    def generate(amount_rows, amount_columns, hole_probability, seed):
+        # type: (int, int, float, int) -> np.ndarray
+        """
+        Generate map
+        :param amount_rows: Int, amount of map rows
+        :param amount_columns: Int, amount of map columns
+        :param hole_probability: Float, probability of every state to be hole
+        :param seed: Int, random generator seed
+        :return: np.ndarray, (amount rows, amount columns) uint8 grid of state value codes
+        """
+        if amount_rows * amount_columns < 2:
+            raise ValueError(f"Map {amount_rows}x{amount_columns} has no place for start and goal.")
+        random_generator = np.random.default_rng(seed)
+
+        # Random holes
+        is_hole = random_generator.random((amount_rows, amount_columns)) < hole_probability
+        grid = np.where(is_hole, ord(BaseStates.HOLE), ord(BaseStates.FROZEN)).astype(np.uint8)
+
+        # Random monotone path from start to goal (shuffled down and right moves) is frozen
+        moves_down = random_generator.permutation(
+            np.repeat([1, 0], [amount_rows - 1, amount_columns - 1])
+        )
+        row_indexes = np.concatenate([[0], np.cumsum(moves_down)])
+        column_indexes = np.concatenate([[0], np.cumsum(1 - moves_down)])
+        grid[row_indexes, column_indexes] = ord(BaseStates.FROZEN)
+        grid[-1, -1] = ord(BaseStates.GOAL)
+        return grid
+
+    @staticmethod
+    def get(map_name):
+        # type: (str) -> np.ndarray
+        """
+        Get generated map by name (from memory, then from disk, else generate it)
+        :param map_name: Str, generated map name, e.g. "gen-2000x2000-p0.2-s7"
+        :return: np.ndarray, (amount rows, amount columns) uint8 grid of state value codes
+        """
+        if map_name in GeneratedMaps.maps:
+            return GeneratedMaps.maps[map_name]
+        params = GeneratedMaps.parse_name(map_name)
+        if params is None:
+            raise TypeError(f"Unknown map name \"{map_name}\".")
+
+        path = None
+        if GeneratedMapParams.CACHE_DIR:
+            path = os.path.join(GeneratedMapParams.CACHE_DIR, f"v{GeneratedMapParams.VERSION}-{map_name}.npy")
+        if path is not None and os.path.isfile(path):
+            grid = np.load(path)
+        else:
+            grid = GeneratedMaps.generate(*params)
+            if path is not None:
+                GeneratedMaps.__save(grid, path)
+        # Maps are shared between environments
+        grid.flags.writeable = False
+        GeneratedMaps.maps[map_name] = grid
+        return grid
+
+    @staticmethod
+    def __save(grid, path):
+        # type: (np.ndarray, str) -> None
+        """ Save map into temporary file then move it (readers never see half written map) """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npy')
+        with os.fdopen(file_descriptor, 'wb') as file:
+            np.save(file, grid)
+        os.replace(temporary_path, path)
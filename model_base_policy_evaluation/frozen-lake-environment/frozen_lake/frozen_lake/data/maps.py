@@ -3,6 +3,9 @@ Maps data
 Generated by: https://gym.openai.com/envs/FrozenLake-v0/
 """
 
+# For generated maps
+from .generated_maps import GeneratedMaps
+
 
 class MapNames(object):
     """ Names for define maps """
@@ -12,17 +15,24 @@ class MapNames(object):
     HUGE = 'huge'
     COLOSSAL = 'colossal'
 
+    @staticmethod
+    def generated(amount_rows, amount_columns, hole_probability, seed):
+        # type: (int, int, float, int) -> str
+        """ Name of generated map, e.g. MapNames.generated(2000, 2000, 0.2, 7) == "gen-2000x2000-p0.2-s7" """
+        return GeneratedMaps.get_name(amount_rows, amount_columns, hole_probability, seed)
+
 
 class Maps(object):
     """ Main maps class aggregator """
 
     @staticmethod
     def get(map_name):
-        # type: (str) -> list
+        # type: (str) -> Union[list, np.ndarray]
         """
         Return map by defined name
-        :param map_name: Str, name from MapNames
-        :return: List, return list of string (being map) if name exist else raise exception
+        :param map_name: Str, name from MapNames or generated map name (see MapNames.generated)
+        :return: List or np.ndarray, return list of string (being map) or uint8 grid of state value codes
+                 (for generated maps) if name exist else raise exception
         """
         if map_name == MapNames.SMALL:
             return Maps.small
@@ -34,6 +44,8 @@ class Maps(object):
             return Maps.huge
         elif map_name == MapNames.COLOSSAL:
             return Maps.colossal
+        elif GeneratedMaps.is_generated(map_name):
+            return GeneratedMaps.get(map_name)
         else:
             raise TypeError(f"Unknown map name \"{map_name}\".")
 
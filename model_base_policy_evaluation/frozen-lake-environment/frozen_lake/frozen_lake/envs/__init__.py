@@ -1,4 +1,6 @@
 # Import default environment
 from .default import Default
 # Import fall environment
-from .fall import Fall
\ No newline at end of file
+from .fall import Fall
+# Import vector environment
+from .vector import VectorFrozenLake
@@ -7,6 +7,8 @@ import random
 
 # For work with gym environment
 import gym
+# For work with compact transition arrays
+import numpy as np
 
 # Import data
 from ..data import Maps, Actions, States, RenderModes, RenderObjectTypes
@@ -31,38 +33,100 @@ class Base(gym.Env):
 
         # Save max episode size
         self.max_episode_size = max_episode_size
+        # Save environment definition names
+        self.map_name = map_name
+        self.action_set_name = action_set_name
+        self.state_set_name = state_set_name
 
-        # Initialize text map, action and state sets
+        # Initialize map (text map or grid of state value codes), action and state sets
         self.text_map = Maps.get(map_name)
         self.action_set = Actions.get(action_set_name)
         self.state_set = States.get(state_set_name)
 
+        # Build map params, spaces and transition arrays
+        self.__build_map()
+
+    def __build_map(self):
+        """ Build everything what depends on map (called on initialization and on every map change) """
+        # Index maps and transition matrix are built on first use (they are slow and big on big maps)
+        self._index_maps = None
+        self._transition_matrix = None
+
         # Calculate map params (map size in any variants)
         self.__calculate_map_params()
-        # Indexing map states
-        self.__index_map()
         # Initialize environment spaces
         self.__initialize_spaces()
-        # Generate transition matrix
-        self.__generate_transition_matrix()
+        # Generate compact transition arrays (used by step)
+        self.__generate_transition_arrays()
 
     def __calculate_map_params(self):
         """ Initialize map params (e.g sizes) """
-        self.amount_rows = len(self.text_map)
-        self.amount_columns = len(self.text_map[0])
+        self.amount_rows, self.amount_columns = self.grid.shape
         self.shape = (self.amount_rows, self.amount_columns)
+        # State value code of every state index (state index is row index * amount columns + column index)
+        self.state_values = self.grid.ravel()
+
+    @property
+    def text_map(self):
+        # type: () -> list
+        """ Map as list of strings (generated from grid on first use for generated maps) """
+        if self._text_map is None:
+            self._text_map = [row.tobytes().decode() for row in self.grid]
+        return self._text_map
+
+    @text_map.setter
+    def text_map(self, value):
+        # type: (Union[list, np.ndarray]) -> None
+        """
+        Set map as list of strings or as grid of state value codes
+        (after initialization map params, spaces and transition arrays are rebuilt for new map)
+        """
+        if isinstance(value, np.ndarray):
+            self._text_map = None
+            self.grid = value
+        else:
+            self._text_map = value
+            self.grid = np.frombuffer(''.join(value).encode(), dtype=np.uint8).reshape(len(value), len(value[0]))
+        if hasattr(self, 'transition_next_states'):
+            self.__build_map()
 
     def __initialize_spaces(self):
         """ Initialize action and observation spaces """
         self.action_space = gym.spaces.Discrete(len(self.action_set))
-        self.observation_space = gym.spaces.Discrete(len(self.index_map))
+        self.observation_space = gym.spaces.Discrete(self.amount_rows * self.amount_columns)
+
+    @property
+    def index_map(self):
+        # type: () -> dict
+        """ Index map - dict[state index, state position] """
+        return self.__get_index_maps()[0]
+
+    @property
+    def unindex_map(self):
+        # type: () -> dict
+        """ Unindex map - dict[state position, state index] """
+        return self.__get_index_maps()[1]
+
+    @property
+    def index_value_map(self):
+        # type: () -> dict
+        """ Index value map - dict[state index, state value (description)] """
+        return self.__get_index_maps()[2]
+
+    def __get_index_maps(self):
+        # type: () -> (dict, dict, dict)
+        """ Get index maps (index map states on first use) """
+        if self._index_maps is None:
+            self._index_maps = self.__index_map()
+        return self._index_maps
 
     def __index_map(self):
+        # type: () -> (dict, dict, dict)
         """ Indexing map states (in any cases) """
         # Index map - dict[state index, state position]
         # Unindex map - dict[state position, state index]
         # Index value map -> dict[state index, state value (description)]
-        self.index_map, self.unindex_map, self.index_value_map = {}, {}, {}
+        index_map, unindex_map, index_value_map = {}, {}, {}
         # Stat state indexing
         state_index = 0
         # Passing for map rows
@@ -72,11 +136,12 @@ class Base(gym.Env):
                 # Format state position
                 position = (row_index, column_index)
                 # Index state in any cases
-                self.index_map[state_index] = position
-                self.unindex_map[position] = state_index
-                self.index_value_map[state_index] = self.text_map[row_index][column_index]
+                index_map[state_index] = position
+                unindex_map[position] = state_index
+                index_value_map[state_index] = self.text_map[row_index][column_index]
                 # Increment state index
                 state_index += 1
+        return index_map, unindex_map, index_value_map
 
     def _get_next_state(self, current_state_index, direction):
         # type: (int, tuple) -> int
@@ -109,6 +174,20 @@ class Base(gym.Env):
         """ For get state reward by current state and next state """
         raise NotImplementedError('Method _get_state_reward not implemented.')
 
+    def _get_state_rewards(self, current_state_indexes, next_state_indexes):
+        # type: (np.ndarray, np.ndarray) -> np.ndarray
+        """
+        Get state rewards for arrays of current and next states
+        (environments override it with array logic, by default call _get_state_reward for every pair)
+        """
+        return np.vectorize(self._get_state_reward, otypes=[float])(current_state_indexes, next_state_indexes)
+
+    @staticmethod
+    def _get_state_codes(states):
+        # type: (list) -> list
+        """ Get state value codes (as in grid) of states """
+        return [ord(state) for state in states]
+
     def _is_round_end(self, state_index):
         # type: (int) -> bool
         """
@@ -126,7 +205,16 @@ class Base(gym.Env):
         """ Get direction probability (work when one action include many directions """
         return 1 / len(directions)
 
+    @property
+    def transition_matrix(self):
+        # type: () -> dict
+        """ Transition matrix (generated from transition arrays on first use) """
+        if self._transition_matrix is None:
+            self._transition_matrix = self.__generate_transition_matrix()
+        return self._transition_matrix
+
     def __generate_transition_matrix(self):
+        # type: () -> dict
         """
         Generate transition matrix for work with on base methods
         Transition matrix -
@@ -135,29 +223,83 @@ class Base(gym.Env):
                     list of action description (probability, next state, reward, terminal state flag)
         """
 
-        # Initialize transition matrix container
-        self.transition_matrix = {
+        # Get transition arrays as lists (python types in transition matrix)
+        next_states = self.transition_next_states.tolist()
+        probabilities = self.transition_probabilities.tolist()
+        rewards = self.transition_rewards.tolist()
+        dones = self.transition_dones.tolist()
+        # Amount of next states of every action (the rest is padding)
+        branches = [(action.index, len(action.directions)) for action in self.action_set]
+        return {
             state_index: {
-                action_index: []
-                for action_index in range(self.action_space.n)
+                action_index: [
+                    (
+                        probabilities[state_index][action_index][branch_index],
+                        next_states[state_index][action_index][branch_index],
+                        rewards[state_index][action_index][branch_index],
+                        dones[state_index][action_index][branch_index]
+                    )
+                    for branch_index in range(amount_branches)
+                ]
+                for action_index, amount_branches in sorted(branches)
             }
-            for state_index in self.index_map
+            for state_index in range(self.observation_space.n)
         }
-        # Pass for states
-        for state_index in self.index_map:
-            # Pass for actions
-            for action in self.action_set:
-                # Pass for directions
-                for direction in action.directions:
-                    # Get next state index by current state index and direction
-                    new_state_index = self._get_next_state(state_index, direction)
-                    # Update transition matrix information
-                    self.transition_matrix[state_index][action.index].append((
-                        self._get_state_probability(action.directions),
-                        new_state_index,
-                        self._get_state_reward(state_index, new_state_index),
-                        self._is_round_end(new_state_index)
-                    ))
+
+    def __generate_transition_arrays(self):
+        """
+        Generate compact transition arrays (the same data as transition matrix)
+        Every array has (amount states, amount actions, max branch) shape,
+        padding transitions are self loops with zero probability:
+            transition_next_states - next state indexes
+            transition_probabilities - transition probabilities
+            transition_cumulative_probabilities - cumulative probabilities (for sample next state)
+            transition_rewards - action rewards
+            transition_dones - terminal state flags
+        """
+
+        # Max amount of next states for one action
+        self.max_branch = max(len(action.directions) for action in self.action_set)
+        shape = (self.observation_space.n, self.action_space.n, self.max_branch)
+
+        # Move directions as (amount actions, max branch, 2) array, valid marks not padding directions
+        directions = np.zeros((self.action_space.n, self.max_branch, 2), dtype=np.int64)
+        valid = np.zeros((self.action_space.n, self.max_branch), dtype=bool)
+        probabilities = np.zeros((self.action_space.n, self.max_branch))
+        for action in self.action_set:
+            directions[action.index, :len(action.directions)] = action.directions
+            valid[action.index, :len(action.directions)] = True
+            probabilities[action.index, :len(action.directions)] = self._get_state_probability(action.directions)
+
+        # Positions of all states
+        state_indexes = np.arange(self.observation_space.n)
+        row_indexes, column_indexes = np.divmod(state_indexes, self.amount_columns)
+        # Move all states by all directions at once (can't exit from board)
+        new_row_indexes = np.clip(row_indexes[:, None, None] + directions[None, :, :, 0], 0, self.amount_rows - 1)
+        new_column_indexes = np.clip(
+            column_indexes[:, None, None] + directions[None, :, :, 1], 0, self.amount_columns - 1
+        )
+        # Transit states move, terminal states (and padding) stay
+        is_transit = np.isin(self.state_values, self._get_state_codes(self.state_set.transit_states))
+        is_move = is_transit[:, None, None] & valid[None]
+        self.transition_next_states = np.where(
+            is_move, new_row_indexes * self.amount_columns + new_column_indexes, state_indexes[:, None, None]
+        ).astype(np.int32)
+        self.transition_probabilities = np.ascontiguousarray(np.broadcast_to(probabilities, shape))
+
+        # Rewards and terminal flags by masks (padding has zero reward and is not terminal)
+        is_end = np.isin(self.state_values, self._get_state_codes(self.state_set.end_states))
+        current_state_indexes = np.broadcast_to(state_indexes[:, None, None], shape)
+        self.transition_rewards = np.where(
+            valid[None], self._get_state_rewards(current_state_indexes, self.transition_next_states), 0
+        ).astype(float)
+        self.transition_dones = is_end[self.transition_next_states] & valid[None]
+
+        # Last next state and padding have cumulative probability 1 (so rounding never samples padding)
+        self.transition_cumulative_probabilities = np.cumsum(self.transition_probabilities, axis=-1)
+        self.transition_cumulative_probabilities[
+            self.transition_cumulative_probabilities >= self.transition_cumulative_probabilities[..., -1:] - 1e-12
+        ] = 1.0
 
     def step(self, action):
         # type: (int) -> (int, float, bool, None)
@@ -170,15 +312,17 @@ class Base(gym.Env):
         # Increment episode size
         self.current_episode_size += 1
 
-        # Get transfer states (from current by chosen action)
-        transfer_states = self.transition_matrix[self.current_state_index][action]
-        # Get move probabilities
-        probabilities = [probability for probability, _, _, _ in transfer_states]
-        # Chose random next state (by probabilties)
-        transfer_state_index = random.choices(range(len(probabilities)), probabilities)[0]
+        # Get flat index of first transfer state (from current by chosen action)
+        transfer_index = (self.current_state_index * self.action_space.n + int(action)) * self.max_branch
+        # Chose random next state (by cumulative probabilities)
+        random_value = random.random()
+        while random_value >= self.transition_cumulative_probabilities.item(transfer_index):
+            transfer_index += 1
 
         # Get step description
-        _, new_state_index, reward, done = transfer_states[transfer_state_index]
+        new_state_index = self.transition_next_states.item(transfer_index)
+        reward = self.transition_rewards.item(transfer_index)
+        done = self.transition_dones.item(transfer_index)
         # If episode size equal max episode size then set end of episode
         if self.current_episode_size == self.max_episode_size:
             done = True
@@ -187,7 +331,7 @@ class Base(gym.Env):
         self.current_state_index = new_state_index
 
         # Return step result
-        return new_state_index, reward, done, _
+        return new_state_index, reward, done, {}
 
     def reset(self, start_state_index=0):
         # type: (int) -> int
@@ -2,11 +2,14 @@
 Default environment class
 """
 
+# For work with arrays of states
+import numpy as np
+
 # For inheritance base environment class
 from .base import Base
 
 # Import map, action, state names and environment initialize params
-from ..data import MapNames, ActionSetNames, StateSetNames, EnvironmentParams
+from ..data import MapNames, ActionSetNames, StateSetNames, EnvironmentParams, BaseStates
 
 
 class Default(Base):
@@ -32,3 +35,9 @@ class Default(Base):
             return 0 if current_state_index == next_state_index else 1
         else:
             return 0
+
+    def _get_state_rewards(self, current_state_indexes, next_state_indexes):
+        # type: (np.ndarray, np.ndarray) -> np.ndarray
+        """ Get state rewards for arrays of states (the same logic as _get_state_reward) """
+        is_goal = self.state_values[next_state_indexes] == ord(BaseStates.GOAL)
+        return np.where(is_goal & (current_state_indexes != next_state_indexes), 1, 0)
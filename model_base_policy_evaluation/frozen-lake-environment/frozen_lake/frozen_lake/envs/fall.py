@@ -2,11 +2,14 @@
 Fall environment class
 """
 
+# For work with arrays of states
+import numpy as np
+
 # For inheritance base environment class
 from .base import Base
 
 # Import map, action, state names and environment initialize params
-from ..data import MapNames, ActionSetNames, StateSetNames, EnvironmentParams
+from ..data import MapNames, ActionSetNames, StateSetNames, EnvironmentParams, BaseStates
 
 
 class Fall(Base):
@@ -35,3 +38,13 @@ class Fall(Base):
             return -0.1
         else:
             return 0
+
+    def _get_state_rewards(self, current_state_indexes, next_state_indexes):
+        # type: (np.ndarray, np.ndarray) -> np.ndarray
+        """ Get state rewards for arrays of states (the same logic as _get_state_reward) """
+        next_state_values = self.state_values[next_state_indexes]
+        is_goal = next_state_values == ord(BaseStates.GOAL)
+        is_hole = next_state_values == ord(BaseStates.HOLE)
+        return np.where(
+            is_goal, np.where(current_state_indexes != next_state_indexes, 1, 0), np.where(is_hole, -0.1, 0)
+        )
@@ -0,0 +1,84 @@
+"""
+Vector environment class
+"""
+
+# For work with batched states
+import numpy as np
+
+
+class VectorFrozenLake(object):
+    """
+    Many copies of one frozen lake environment stepped together
+    (states, episode sizes and transition tables are NumPy arrays,
+    so one step of all copies is one vectorized sampling call)
+    """
+
+    def __init__(self, env, amount_envs, seed=None):
+        # type: (gym.Env, int, Optional[int]) -> None
+        """
+        :param env: gym.Env, frozen lake environment (copied amount_envs times)
+        :param amount_envs: Int, amount of environment copies
+        :param seed: Int or None, random generator seed
+        """
+        self.env = env.unwrapped
+        self.amount_envs = amount_envs
+        self.max_episode_size = self.env.max_episode_size
+        self.action_space = self.env.action_space
+        self.observation_space = self.env.observation_space
+
+        # Transition tables - (amount states, amount actions, max branch) arrays shared with environment
+        self.next_states = self.env.transition_next_states
+        self.cumulative_probabilities = self.env.transition_cumulative_probabilities
+        self.rewards = self.env.transition_rewards
+        self.dones = self.env.transition_dones
+
+        # Batched environment state
+        self.start_state_index = 0
+        self.current_state_indexes = np.zeros(amount_envs, dtype=np.int64)
+        self.current_episode_sizes = np.zeros(amount_envs, dtype=np.int64)
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        # type: (Optional[int]) -> None
+        """ Set vector env generator seed """
+        self.random_generator = np.random.default_rng(seed)
+
+    def reset(self, start_state_index=0):
+        # type: (int) -> np.ndarray
+        """
+        Reset all environment copies for start new episodes
+        :param start_state_index: Int, from which state need start episodes (also used by auto reset)
+        :return: np.ndarray, (amount envs, ) start state indexes
+        """
+        self.start_state_index = start_state_index
+        self.current_state_indexes[:] = start_state_index
+        self.current_episode_sizes[:] = 0
+        return self.current_state_indexes.copy()
+
+    def step(self, actions):
+        # type: (np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray, dict)
+        """
+        Play one time in every environment copy (finished copies are reset automatically)
+        :param actions: np.ndarray, (amount envs, ) chosen actions
+        :return: (np.ndarray, np.ndarray, np.ndarray, dict) - current states (start state for finished copies),
+                 rewards, flags end of episode and step description with states where episodes ended
+        """
+        states, actions = self.current_state_indexes, np.asarray(actions)
+        self.current_episode_sizes += 1
+
+        # Chose random next states (by cumulative probabilities)
+        random_values = self.random_generator.random(self.amount_envs)
+        transfer_indexes = np.sum(random_values[:, None] >= self.cumulative_probabilities[states, actions], axis=1)
+
+        # Get step description
+        new_state_indexes = self.next_states[states, actions, transfer_indexes].astype(np.int64)
+        rewards = self.rewards[states, actions, transfer_indexes]
+        dones = self.dones[states, actions, transfer_indexes] | (self.current_episode_sizes == self.max_episode_size)
+
+        # Auto reset finished copies
+        terminal_state_indexes = new_state_indexes.copy()
+        new_state_indexes[dones] = self.start_state_index
+        self.current_episode_sizes[dones] = 0
+        self.current_state_indexes = new_state_indexes
+
+        return new_state_indexes.copy(), rewards, dones, {'terminal_states': terminal_state_indexes}
@@ -0,0 +1,10 @@
+# Import sparse transition model
+from .model import SparseModel
+# Import bellman backup engine
+from .backup import BellmanBackup
+# Import model cache
+from .cache import ModelCache, get_model, model_cache
+# Import direct evaluation solvers
+from .solvers import SolverNames, solve_policy_values, solve_policy_values_batch
+# Import sweep modes for iterative evaluation and value iteration
+from .sweeps import StoppingRules, SweepModes, compare_sweep_modes, get_sweep_blocks, prioritized_sweeping, run_sweeps
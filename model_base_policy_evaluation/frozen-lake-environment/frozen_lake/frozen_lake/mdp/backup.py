@@ -0,0 +1,65 @@
+"""
+Bellman backup engine
+"""
+
+# For work with model arrays
+import numpy as np
+
+
+class BellmanBackup(object):
+    """ Batched Bellman backups Q = R_sa + gamma * P * V for all states and actions at once """
+
+    def __init__(self, model, gamma):
+        # type: (SparseModel, float) -> None
+        """
+        :param model: SparseModel, transition model
+        :param gamma: Float, discount factor
+        """
+        self.model = model
+        self.gamma = gamma
+        # Discounted successor probabilities (gamma * P), shared by all backups
+        self.discounted_probabilities = gamma * model.probabilities
+
+    def q_values(self, V):
+        # type: (np.ndarray) -> np.ndarray
+        """
+        Get action values for every state
+        :param V: np.ndarray, (amount states, ) state values
+        :return: np.ndarray, (amount states, amount actions) action values
+        """
+        return self.model.expected_rewards + np.einsum(
+            'sak,sak->sa', self.discounted_probabilities, V[self.model.next_states]
+        )
+
+    def evaluate(self, policy, V):
+        # type: (np.ndarray, np.ndarray) -> np.ndarray
+        """ Expected backup under policy: V(s) = sum_a pi(a|s) * Q(s, a) """
+        return np.einsum('sa,sa->s', policy, self.q_values(V))
+
+    def optimal(self, V):
+        # type: (np.ndarray) -> np.ndarray
+        """ Optimal backup: V(s) = max_a Q(s, a) """
+        return self.q_values(V).max(axis=1)
+
+    def greedy_actions(self, V, current_actions=None):
+        # type: (np.ndarray, Optional[np.ndarray]) -> np.ndarray
+        """
+        Get greedy action for every state
+        :param V: np.ndarray, (amount states, ) state values
+        :param current_actions: np.ndarray or None, current actions (kept on ties to avoid policy cycling)
+        :return: np.ndarray, (amount states, ) greedy action indexes
+        """
+        q = self.q_values(V)
+        actions = q.argmax(axis=1)
+        if current_actions is not None:
+            state_indexes = np.arange(self.model.amount_states)
+            ties = np.isclose(q[state_indexes, actions], q[state_indexes, current_actions])
+            actions[ties] = current_actions[ties]
+        return actions
+
+    def greedy_policy(self, V, current_actions=None):
+        # type: (np.ndarray, Optional[np.ndarray]) -> np.ndarray
+        """ Get deterministic (one hot) greedy policy, see greedy_actions """
+        policy = np.zeros((self.model.amount_states, self.model.amount_actions))
+        policy[np.arange(self.model.amount_states), self.greedy_actions(V, current_actions)] = 1
+        return policy
@@ -0,0 +1,129 @@
+"""
+Transition model cache
+"""
+
+# For least recently used order of models in memory
+from collections import OrderedDict
+# For build environment definition digest
+import hashlib
+# For work with cache directory
+import os
+# For atomic write of model directory
+import shutil
+import tempfile
+
+# For digest map grid
+import numpy as np
+
+# For build models
+from .model import SparseModel
+
+
+class ModelCache(object):
+    """
+    Memoized transition models
+    (model is built once per environment definition and optionally persisted on disk as .npy files,
+    any change of map, action set, state set or reward logic gives new key and so new model)
+    """
+    # Increment when model building logic changes (invalidates persisted models)
+    VERSION = 2
+    # Default max total size of models in memory (1 GiB)
+    MAX_BYTES = 2 ** 30
+
+    def __init__(self, cache_dir=None, max_bytes=MAX_BYTES):
+        # type: (Optional[str], Optional[int]) -> None
+        """
+        :param cache_dir: Str or None, directory for persisted models (None - keep models only in memory)
+        :param max_bytes: Int or None, max total size of models in memory, least recently used models are dropped
+        (the last model is always kept, None - no limit)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # Models in memory in least recently used first order - dict[model key, SparseModel]
+        self.models = OrderedDict()
+
+    @classmethod
+    def get_key(cls, env):
+        # type: (gym.Env) -> str
+        """
+        Get model key by environment definition
+        (readable names plus digest of map, actions, states and reward logic,
+        names alone are not enough because definitions can change under the same name)
+        """
+        env = env.unwrapped
+        reward_codes = [type(env)._get_state_reward.__code__, type(env)._get_state_rewards.__code__]
+        definition = repr((
+            cls.VERSION,
+            type(env).__name__,
+            env.grid.shape,
+            hashlib.sha1(np.ascontiguousarray(env.grid).tobytes()).hexdigest(),
+            [(action.index, action.directions) for action in env.action_set],
+            dict(env.state_set),
+            [(reward_code.co_code, reward_code.co_consts) for reward_code in reward_codes],
+        ))
+        digest = hashlib.sha1(definition.encode()).hexdigest()[:16]
+        return f"{type(env).__name__.lower()}-{env.map_name}-{env.action_set_name}-{digest}"
+
+    def get(self, env):
+        # type: (gym.Env) -> SparseModel
+        """
+        Get model of environment (from memory, then from disk, else build it)
+        :param env: gym.Env, frozen lake environment
+        :return: SparseModel, environment model
+        """
+        key = self.get_key(env)
+        if key in self.models:
+            self.models.move_to_end(key)
+            return self.models[key]
+        path = os.path.join(self.cache_dir, key) if self.cache_dir is not None else None
+        if path is not None and os.path.isdir(path):
+            model = SparseModel.load(path)
+        else:
+            model = SparseModel.from_env(env)
+            if path is not None:
+                self.__persist(model, path)
+        self.models[key] = model
+        self.__evict()
+        return model
+
+    def __evict(self):
+        """ Drop least recently used models while models in memory are bigger than max bytes """
+        if self.max_bytes is None:
+            return
+        total_bytes = sum(model.nbytes for model in self.models.values())
+        while len(self.models) > 1 and total_bytes > self.max_bytes:
+            _, model = self.models.popitem(last=False)
+            total_bytes -= model.nbytes
+
+    def __persist(self, model, path):
+        # type: (SparseModel, str) -> None
+        """ Save model into temporary directory then move it (readers never see half written model) """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary_path = tempfile.mkdtemp(dir=self.cache_dir)
+        model.save(temporary_path)
+        try:
+            os.rename(temporary_path, path)
+        except OSError:
+            # Other process already saved the same model
+            shutil.rmtree(temporary_path, ignore_errors=True)
+
+    def clear(self, persisted=False):
+        # type: (bool) -> None
+        """
+        Drop cached models
+        :param persisted: Bool, also remove models saved on disk
+        """
+        self.models.clear()
+        if persisted and self.cache_dir is not None and os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+
+
+# Default cache (set FROZEN_LAKE_MODEL_CACHE_DIR for persist models between runs,
+# models in memory are limited by ModelCache.MAX_BYTES, call model_cache.clear() to free them at once)
+model_cache = ModelCache(os.environ.get('FROZEN_LAKE_MODEL_CACHE_DIR'))
+
+
+def get_model(env):
+    # type: (gym.Env) -> SparseModel
+    """ Get environment model from default cache """
+    return model_cache.get(env)
@@ -0,0 +1,186 @@
+"""
+Sparse transition model
+"""
+
+# For work with model files
+import os
+
+# For work with model arrays
+import numpy as np
+
+
+class SparseModel(object):
+    """
+    Transition model stored as padded successor arrays
+    (every state-action pair keeps at most max_branch successors,
+    so memory grows with states * actions * branching instead of states * actions * states)
+    """
+    # Names of arrays which define model (and are saved on disk)
+    ARRAY_NAMES = ('next_states', 'probabilities', 'rewards', 'dones')
+
+    def __init__(self, next_states, probabilities, rewards, dones):
+        # type: (np.ndarray, np.ndarray, np.ndarray, np.ndarray) -> None
+        """
+        All arrays have (amount states, amount actions, max branch) shape
+        :param next_states: np.ndarray, successor state indexes (padding points to the state itself)
+        :param probabilities: np.ndarray, successor probabilities (padding has zero probability)
+        :param rewards: np.ndarray, transition rewards
+        :param dones: np.ndarray, terminal state flags
+        """
+        self.next_states = next_states
+        self.probabilities = probabilities
+        self.rewards = rewards
+        self.dones = dones
+        self.amount_states, self.amount_actions, self.max_branch = next_states.shape
+        # Expected reward of every state-action pair (R_sa)
+        self.expected_rewards = np.sum(probabilities * rewards, axis=-1)
+
+    @classmethod
+    def from_transition_matrix(cls, transition_matrix, amount_actions):
+        # type: (dict, int) -> SparseModel
+        """
+        Build model from environment transition matrix
+        :param transition_matrix: Dict, env.transition_matrix
+        :param amount_actions: Int, amount of actions
+        :return: SparseModel, model with the same transitions
+        """
+        amount_states = len(transition_matrix)
+        max_branch = max(
+            len(transitions)
+            for actions in transition_matrix.values()
+            for transitions in actions.values()
+        )
+        shape = (amount_states, amount_actions, max_branch)
+        # Padding successors are self loops with zero probability (safe for gather by state index)
+        next_states = np.repeat(np.arange(amount_states, dtype=np.int32), amount_actions * max_branch).reshape(shape)
+        probabilities = np.zeros(shape)
+        rewards = np.zeros(shape)
+        dones = np.zeros(shape, dtype=bool)
+        # Pass for states, actions and their successors
+        for state_index, actions in transition_matrix.items():
+            for action_index, transitions in actions.items():
+                for branch_index, (probability, next_state_index, reward, done) in enumerate(transitions):
+                    next_states[state_index, action_index, branch_index] = next_state_index
+                    probabilities[state_index, action_index, branch_index] = probability
+                    rewards[state_index, action_index, branch_index] = reward
+                    dones[state_index, action_index, branch_index] = done
+        return cls(next_states, probabilities, rewards, dones)
+
+    @classmethod
+    def from_env(cls, env):
+        # type: (gym.Env) -> SparseModel
+        """ Build model from frozen lake environment (shares its compact transition arrays) """
+        env = env.unwrapped
+        return cls(env.transition_next_states, env.transition_probabilities, env.transition_rewards, env.transition_dones)
+
+    def save(self, path):
+        # type: (str) -> None
+        """
+        Save model arrays as .npy files (one file per array)
+        :param path: Str, model directory
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        # type: (str, Optional[str]) -> SparseModel
+        """
+        Load model saved by SparseModel.save
+        :param path: Str, model directory
+        :param mmap_mode: Str or None, numpy memory map mode (None for load arrays into memory)
+        :return: SparseModel, loaded model
+        """
+        return cls(*[np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in cls.ARRAY_NAMES])
+
+    @property
+    def nbytes(self):
+        # type: () -> int
+        """ Model memory size in bytes """
+        return sum(array.nbytes for array in (
+            self.next_states, self.probabilities, self.rewards, self.dones, self.expected_rewards
+        ))
+
+    def subset(self, states):
+        # type: (Union[slice, np.ndarray]) -> SparseModel
+        """
+        Get model of given states only (successor indexes still point to states of full model,
+        so backups of subset read values of all states)
+        :param states: slice or np.ndarray, state indexes
+        :return: SparseModel, (amount given states, amount actions, max branch) model
+        """
+        return SparseModel(*[getattr(self, name)[states] for name in self.ARRAY_NAMES])
+
+    def restrict(self, actions):
+        # type: (np.ndarray) -> SparseModel
+        """
+        Get model with only one (given) action in every state
+        (optimal backup of restricted model is expected backup of deterministic policy, but A times cheaper)
+        :param actions: np.ndarray, (amount states, ) action index of every state
+        :return: SparseModel, (amount states, 1, max branch) model
+        """
+        state_indexes = np.arange(self.amount_states)
+        return SparseModel(*[getattr(self, name)[state_indexes, actions][:, None] for name in self.ARRAY_NAMES])
+
+    def get_predecessors(self):
+        # type: () -> (np.ndarray, np.ndarray, np.ndarray)
+        """
+        Get predecessor index in CSR form: predecessors of state s are predecessors[indptr[s]:indptr[s + 1]]
+        (state p is predecessor of s if some action of p moves into s with non zero probability,
+        every predecessor is listed once, self loops are listed too)
+        :return: (np.ndarray, np.ndarray, np.ndarray) - (amount states + 1, ) offsets, predecessor state indexes
+        and max over actions of probability to move from predecessor into state
+        """
+        shape = (self.amount_states, self.amount_actions)
+        is_edge = np.asarray(self.probabilities) > 0
+        state_indexes, action_indexes = [
+            np.broadcast_to(indexes[..., None], self.next_states.shape)[is_edge] for indexes in np.indices(shape)
+        ]
+        # Probabilities of (successor, predecessor, action) triples summed over branches
+        next_state_indexes = np.asarray(self.next_states)[is_edge].astype(np.int64)
+        triples, inverse = np.unique(
+            (next_state_indexes * self.amount_states + state_indexes) * self.amount_actions + action_indexes,
+            return_inverse=True
+        )
+        triple_probabilities = np.bincount(inverse.ravel(), weights=np.asarray(self.probabilities)[is_edge])
+        # Unique (successor, predecessor) pairs sorted by successor with max probability over actions
+        pairs = triples // self.amount_actions
+        starts = np.flatnonzero(np.r_[True, pairs[1:] != pairs[:-1]])
+        successors, predecessors = np.divmod(pairs[starts], self.amount_states)
+        indptr = np.zeros(self.amount_states + 1, dtype=np.int64)
+        np.cumsum(np.bincount(successors, minlength=self.amount_states), out=indptr[1:])
+        return indptr, predecessors.astype(np.int32), np.maximum.reduceat(triple_probabilities, starts)
+
+    def to_dense(self):
+        # type: () -> (np.ndarray, np.ndarray)
+        """
+        Get dense (amount states, amount actions, amount states) P and R tensors
+        (repeated successors are merged: probabilities are summed, rewards are probability weighted)
+        """
+        shape = (self.amount_states, self.amount_actions, self.amount_states)
+        state_indexes, action_indexes = np.indices(self.next_states.shape)[:2]
+        index = (state_indexes, action_indexes, self.next_states)
+        P = np.zeros(shape)
+        R = np.zeros(shape)
+        np.add.at(P, index, self.probabilities)
+        np.add.at(R, index, self.probabilities * self.rewards)
+        np.divide(R, P, out=R, where=P > 0)
+        return P, R
+
+    def policy_transitions(self, policy):
+        # type: (np.ndarray) -> np.ndarray
+        """
+        Get dense state transition matrix P_pi under policy
+        :param policy: np.ndarray, (amount states, amount actions) action probabilities
+        :return: np.ndarray, (amount states, amount states) transition matrix
+        """
+        p_pi = np.zeros((self.amount_states, self.amount_states))
+        state_indexes = np.broadcast_to(np.arange(self.amount_states)[:, None, None], self.next_states.shape)
+        np.add.at(p_pi, (state_indexes, self.next_states), policy[:, :, None] * self.probabilities)
+        return p_pi
+
+    def policy_rewards(self, policy):
+        # type: (np.ndarray) -> np.ndarray
+        """ Get expected one step reward r_pi under policy """
+        return np.sum(policy * self.expected_rewards, axis=1)
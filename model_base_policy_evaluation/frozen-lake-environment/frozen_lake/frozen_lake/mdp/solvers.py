@@ -0,0 +1,296 @@
+"""
+Linear solvers for direct policy evaluation: (I - gamma * P_pi) V = r_pi
+"""
+
+# For measure solver time
+import time
+
+# For work with model arrays
+import numpy as np
+
+# Scipy is optional (used for sparse direct and Krylov solvers)
+try:
+    from scipy import sparse
+    from scipy.sparse import linalg as sparse_linalg
+except ImportError:
+    sparse = None
+    sparse_linalg = None
+
+# For iterative fallback solver
+from .backup import BellmanBackup
+
+
+class SolverNames(object):
+    """ Names for define direct evaluation solvers """
+    # Choose solver by amount of states and available packages
+    AUTO = 'auto'
+    # Dense LU solve (numpy)
+    LU = 'lu'
+    # Sparse LU solve (scipy)
+    SPARSE_LU = 'splu'
+    # Krylov solvers with warm start (scipy)
+    GMRES = 'gmres'
+    BICGSTAB = 'bicgstab'
+    # Fixed point iteration V = r_pi + gamma * P_pi * V (numpy, fallback without scipy)
+    ITERATIVE = 'iterative'
+
+
+class SolverParams(object):
+    """ Solver choice params """
+    # Max amount of states for dense LU solve
+    DENSE_MAX_STATES = 500
+    # Max amount of states for sparse LU solve (Krylov solvers are used for bigger systems)
+    SPARSE_LU_MAX_STATES = 200000
+    # Relative tolerance of iterative solvers
+    TOLERANCE = 1e-10
+    # Max amount of iterations of iterative solvers
+    MAX_ITERATIONS = 100000
+    # Max amount of elements of arrays built for batch of policies at once (policies are split into chunks)
+    BATCH_MAX_ELEMENTS = 2 ** 24
+
+
+def choose_solver(amount_states):
+    # type: (int) -> str
+    """ Choose solver by amount of states """
+    if amount_states <= SolverParams.DENSE_MAX_STATES:
+        return SolverNames.LU
+    elif sparse is None:
+        return SolverNames.ITERATIVE
+    elif amount_states <= SolverParams.SPARSE_LU_MAX_STATES:
+        return SolverNames.SPARSE_LU
+    else:
+        return SolverNames.GMRES
+
+
+def get_sparse_policy_transitions(model, policy):
+    # type: (SparseModel, np.ndarray) -> sparse.csr_matrix
+    """ Get sparse (amount states, amount states) transition matrix P_pi under policy """
+    rows = np.repeat(np.arange(model.amount_states), model.amount_actions * model.max_branch)
+    values = (policy[:, :, None] * model.probabilities).ravel()
+    # Duplicated (row, column) pairs are summed by csr conversion
+    return sparse.csr_matrix(
+        (values, (rows, np.asarray(model.next_states).ravel())),
+        shape=(model.amount_states, model.amount_states)
+    )
+
+
+def get_batch_size(amount_policies, policy_elements):
+    # type: (int, int) -> int
+    """ Get amount of policies solved at once, so batch arrays have at most BATCH_MAX_ELEMENTS elements """
+    return int(np.clip(SolverParams.BATCH_MAX_ELEMENTS // max(policy_elements, 1), 1, max(amount_policies, 1)))
+
+
+def get_batch_transitions(model, policies):
+    # type: (SparseModel, np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray)
+    """
+    Get transitions of every policy with repeated successors of state merged
+    (all actions of state share one successors row, so backup gathers fewer values than model has branches)
+    :param model: SparseModel, transition model
+    :param policies: np.ndarray, (amount policies, amount states, amount actions) action probabilities
+    :return: (np.ndarray, np.ndarray, np.ndarray) - (amount states, max successors) successor indexes,
+    (amount policies, amount states, max successors) successor probabilities and
+    (amount policies, amount states) expected rewards under every policy
+    """
+    amount_policies, amount_states = len(policies), model.amount_states
+    next_states = np.asarray(model.next_states).reshape((amount_states, -1))
+    order = np.argsort(next_states, axis=1, kind='stable')
+    sorted_next_states = np.take_along_axis(next_states, order, axis=1)
+    # Position of every branch in merged successors row
+    positions = np.cumsum(np.diff(sorted_next_states, axis=1, prepend=-1) != 0, axis=1) - 1
+    max_successors = int(positions.max()) + 1
+    # Padding successors point to the state itself with zero probability
+    successors = np.repeat(np.arange(amount_states)[:, None], max_successors, axis=1)
+    np.put_along_axis(successors, positions, sorted_next_states, axis=1)
+    branch_probabilities = (policies[:, :, :, None] * model.probabilities).reshape((amount_policies, amount_states, -1))
+    branch_probabilities = np.take_along_axis(branch_probabilities, order[None], axis=2)
+    rows = np.arange(amount_policies * amount_states).reshape((amount_policies, amount_states, 1))
+    indexes = rows * max_successors + positions[None]
+    probabilities = np.bincount(
+        indexes.ravel(), weights=branch_probabilities.ravel(), minlength=rows.size * max_successors
+    ).reshape((amount_policies, amount_states, max_successors))
+    return successors, probabilities, np.einsum('psa,sa->ps', policies, model.expected_rewards)
+
+
+def evaluate_batch(transitions, gammas, V):
+    # type: (tuple, np.ndarray, np.ndarray) -> np.ndarray
+    """
+    Expected backups under every policy with every discount factor at once
+    :param transitions: Tuple, get_batch_transitions result
+    :param gammas: np.ndarray, (amount gammas, ) discount factors
+    :param V: np.ndarray, (amount policies, amount gammas, amount states) state values
+    :return: np.ndarray, (amount policies, amount gammas, amount states) backed up state values
+    """
+    successors, probabilities, r_pi = transitions
+    expected_values = np.einsum('psk,pgsk->pgs', probabilities, V[:, :, successors])
+    return r_pi[:, None] + gammas[None, :, None] * expected_values
+
+
+def _solve_krylov(solver, a, b, x0, tolerance):
+    # type: (str, sparse.csr_matrix, np.ndarray, Optional[np.ndarray], float) -> (np.ndarray, int)
+    """ Solve system by GMRES or BiCGSTAB, return solution and amount of iterations """
+    iterations = [0]
+
+    def callback(_):
+        iterations[0] += 1
+
+    method = sparse_linalg.gmres if solver == SolverNames.GMRES else sparse_linalg.bicgstab
+    kwargs = {'x0': x0, 'maxiter': SolverParams.MAX_ITERATIONS, 'callback': callback}
+    if solver == SolverNames.GMRES:
+        kwargs['callback_type'] = 'pr_norm'
+    try:
+        v, exit_code = method(a, b, rtol=tolerance, atol=0.0, **kwargs)
+    except TypeError:
+        # Old scipy versions name relative tolerance "tol"
+        v, exit_code = method(a, b, tol=tolerance, atol=0.0, **kwargs)
+    if exit_code != 0:
+        raise RuntimeError(f"Solver \"{solver}\" did not converge (exit code {exit_code}).")
+    return v, iterations[0]
+
+
+def _solve_iterative(model, policy, gamma, x0, tolerance):
+    # type: (SparseModel, np.ndarray, float, Optional[np.ndarray], float) -> (np.ndarray, int)
+    """ Solve system by fixed point iteration, return solution and amount of iterations """
+    backup = BellmanBackup(model, gamma)
+    v = np.zeros(model.amount_states) if x0 is None else np.array(x0, dtype=float)
+    for iteration in range(1, SolverParams.MAX_ITERATIONS + 1):
+        prev_v = v
+        v = backup.evaluate(policy, prev_v)
+        if np.max(np.abs(v - prev_v)) <= tolerance * max(1.0, np.max(np.abs(v))):
+            return v, iteration
+    raise RuntimeError(f"Solver \"{SolverNames.ITERATIVE}\" did not converge.")
+
+
+def solve_policy_values(model, policy, gamma, solver=SolverNames.AUTO, x0=None, tolerance=SolverParams.TOLERANCE):
+    # type: (SparseModel, np.ndarray, float, str, Optional[np.ndarray], float) -> (np.ndarray, dict)
+    """
+    Direct policy evaluation: solve (I - gamma * P_pi) V = r_pi without explicit matrix inversion
+    :param model: SparseModel, transition model
+    :param policy: np.ndarray, (amount states, amount actions) action probabilities
+    :param gamma: Float, discount factor
+    :param solver: Str, name from SolverNames
+    :param x0: np.ndarray or None, warm start for iterative solvers (e.g. values of previous policy)
+    :param tolerance: Float, relative tolerance of iterative solvers
+    :return: (np.ndarray, dict) - state values and solver report (solver, states, time, iterations, residual)
+    """
+    start_time = time.perf_counter()
+    if solver == SolverNames.AUTO:
+        solver = choose_solver(model.amount_states)
+    if solver in (SolverNames.SPARSE_LU, SolverNames.GMRES, SolverNames.BICGSTAB) and sparse is None:
+        raise ImportError(f"Solver \"{solver}\" requires scipy.")
+
+    r_pi = model.policy_rewards(policy)
+    iterations = 1
+    if solver == SolverNames.LU:
+        a = np.eye(model.amount_states) - gamma * model.policy_transitions(policy)
+        v = np.linalg.solve(a, r_pi)
+    elif solver == SolverNames.ITERATIVE:
+        a = None
+        v, iterations = _solve_iterative(model, policy, gamma, x0, tolerance)
+    elif solver in (SolverNames.SPARSE_LU, SolverNames.GMRES, SolverNames.BICGSTAB):
+        a = sparse.identity(model.amount_states, format='csr') - gamma * get_sparse_policy_transitions(model, policy)
+        if solver == SolverNames.SPARSE_LU:
+            v = sparse_linalg.splu(a.tocsc()).solve(r_pi)
+        else:
+            v, iterations = _solve_krylov(solver, a, r_pi, x0, tolerance)
+    else:
+        raise TypeError(f"Unknown solver name \"{solver}\".")
+    solve_time = time.perf_counter() - start_time
+
+    # Residual is computed after timing (it is report, not part of solve)
+    if a is None:
+        residual = np.max(np.abs(BellmanBackup(model, gamma).evaluate(policy, v) - v))
+    else:
+        residual = np.max(np.abs(a @ v - r_pi))
+    return v, {
+        'solver': solver,
+        'states': model.amount_states,
+        'time': solve_time,
+        'iterations': iterations,
+        'residual': float(residual),
+    }
+
+
+def solve_policy_values_batch(model, policies, gammas, solver=SolverNames.AUTO, tolerance=SolverParams.TOLERANCE):
+    # type: (SparseModel, np.ndarray, np.ndarray, str, float) -> (np.ndarray, dict)
+    """
+    Direct evaluation of many policies with many discount factors
+    (transition matrix of every policy is built once for all discount factors, dense LU solves whole chunk
+    of systems by one batched call, iterative solver sweeps all values at once,
+    sparse solvers go through discount factors in ascending order and warm start from previous solution)
+    :param model: SparseModel, transition model
+    :param policies: np.ndarray, (amount policies, amount states, amount actions) action probabilities
+    :param gammas: np.ndarray, (amount gammas, ) discount factors
+    :param solver: Str, name from SolverNames
+    :param tolerance: Float, relative tolerance of iterative solvers
+    :return: (np.ndarray, dict) - (amount policies, amount gammas, amount states) state values and solver report
+    (solver, states, policies, gammas, time, iterations - max over systems, residual - max over systems)
+    """
+    start_time = time.perf_counter()
+    policies = np.asarray(policies, dtype=float)
+    gammas = np.atleast_1d(np.asarray(gammas, dtype=float))
+    if solver == SolverNames.AUTO:
+        solver = choose_solver(model.amount_states)
+    if solver in (SolverNames.SPARSE_LU, SolverNames.GMRES, SolverNames.BICGSTAB) and sparse is None:
+        raise ImportError(f"Solver \"{solver}\" requires scipy.")
+
+    amount_policies, amount_gammas, amount_states = len(policies), len(gammas), model.amount_states
+    values = np.empty((amount_policies, amount_gammas, amount_states))
+    iterations = 1
+    if solver == SolverNames.LU:
+        batch_size = get_batch_size(amount_policies, amount_gammas * amount_states ** 2)
+        for start in range(0, amount_policies, batch_size):
+            batch = policies[start:start + batch_size]
+            p_pi = np.stack([model.policy_transitions(policy) for policy in batch])
+            a = np.eye(amount_states) - gammas[None, :, None, None] * p_pi[:, None]
+            r_pi = np.einsum('psa,sa->ps', batch, model.expected_rewards)
+            values[start:start + batch_size] = np.linalg.solve(a, r_pi[:, None, :, None])[..., 0]
+    elif solver == SolverNames.ITERATIVE:
+        batch_size = get_batch_size(amount_policies, amount_gammas * model.next_states.size)
+        for start in range(0, amount_policies, batch_size):
+            transitions = get_batch_transitions(model, policies[start:start + batch_size])
+            v = np.zeros((len(transitions[2]), amount_gammas, amount_states))
+            for iteration in range(1, SolverParams.MAX_ITERATIONS + 1):
+                prev_v = v
+                v = evaluate_batch(transitions, gammas, prev_v)
+                errors = np.max(np.abs(v - prev_v), axis=-1)
+                if np.all(errors <= tolerance * np.maximum(1.0, np.max(np.abs(v), axis=-1))):
+                    break
+            else:
+                raise RuntimeError(f"Solver \"{SolverNames.ITERATIVE}\" did not converge.")
+            values[start:start + batch_size] = v
+            iterations = max(iterations, iteration)
+    elif solver in (SolverNames.SPARSE_LU, SolverNames.GMRES, SolverNames.BICGSTAB):
+        identity = sparse.identity(amount_states, format='csr')
+        for policy_index, policy in enumerate(policies):
+            p_pi = get_sparse_policy_transitions(model, policy)
+            r_pi = model.policy_rewards(policy)
+            v = None
+            for gamma_index in np.argsort(gammas):
+                a = identity - gammas[gamma_index] * p_pi
+                if solver == SolverNames.SPARSE_LU:
+                    v = sparse_linalg.splu(a.tocsc()).solve(r_pi)
+                else:
+                    v, solver_iterations = _solve_krylov(solver, a, r_pi, v, tolerance)
+                    iterations = max(iterations, solver_iterations)
+                values[policy_index, gamma_index] = v
+    else:
+        raise TypeError(f"Unknown solver name \"{solver}\".")
+    solve_time = time.perf_counter() - start_time
+
+    # Residual |T_pi(V) - V| is computed after timing (it is report, not part of solve)
+    residual = 0.0
+    batch_size = get_batch_size(amount_policies, amount_gammas * model.next_states.size)
+    for start in range(0, amount_policies, batch_size):
+        transitions = get_batch_transitions(model, policies[start:start + batch_size])
+        batch_values = values[start:start + batch_size]
+        batch_residual = np.abs(evaluate_batch(transitions, gammas, batch_values) - batch_values)
+        residual = max(residual, float(np.max(batch_residual, initial=0.0)))
+    return values, {
+        'solver': solver,
+        'states': amount_states,
+        'policies': amount_policies,
+        'gammas': amount_gammas,
+        'time': solve_time,
+        'iterations': iterations,
+        'residual': residual,
+    }
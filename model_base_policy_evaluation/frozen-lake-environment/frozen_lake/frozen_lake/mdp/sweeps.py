@@ -0,0 +1,256 @@
+"""
+Sweep modes for iterative policy evaluation and value iteration
+"""
+
+# For priority queue of bellman errors
+import heapq
+# For measure sweeps time
+import time
+
+# For work with model arrays
+import numpy as np
+
+# For bellman backups
+from .backup import BellmanBackup
+
+
+class SweepModes(object):
+    """ Names for define order of state updates in one sweep """
+    # Synchronous sweep: every state is backed up from values of previous sweep
+    JACOBI = 'jacobi'
+    # In place sweep in state index order: backups read values already updated in this sweep
+    GAUSS_SEIDEL = 'gauss-seidel'
+    # In place sweep by breadth first layers from rewarded states over reversed transitions
+    # (states near the goal are updated first, so its value reaches start state in few sweeps)
+    REVERSE_TOPOLOGICAL = 'reverse-topological'
+
+
+class StoppingRules(object):
+    """ Names for define when sweeps stop """
+    # Max norm of values change in one sweep is less than threshold
+    # (error bound ||V - V*|| <= gamma / (1 - gamma) * delta)
+    DELTA = 'delta'
+    # Span (max - min) of values change in one sweep is less than threshold, only for Jacobi sweeps
+    # (MacQueen bounds V + gamma / (1 - gamma) * [min change, max change] contain V*, midpoint of bounds is returned,
+    # error bound is gamma / (1 - gamma) * span / 2)
+    SPAN = 'span'
+
+
+class SweepParams(object):
+    """ Sweep params """
+    # Amount of consecutive states backed up at once by Gauss-Seidel sweep
+    # (1 - exact state by state order, but python loop over states is slow for big maps)
+    BLOCK_SIZE = 64
+
+
+def get_reverse_topological_layers(model):
+    # type: (SparseModel) -> list
+    """
+    Split states into breadth first layers over reversed transitions
+    (first layer - states entered by rewarded transitions, next layer - predecessors of previous layer,
+    states which can not reach rewarded states are the last layer)
+    :param model: SparseModel, transition model
+    :return: List, np.ndarray state indexes of every layer
+    """
+    indptr, predecessors, _ = model.get_predecessors()
+    is_rewarded = (np.asarray(model.probabilities) > 0) & (np.asarray(model.rewards) != 0)
+    layer = np.unique(np.asarray(model.next_states)[is_rewarded])
+    visited = np.zeros(model.amount_states, dtype=bool)
+    layers = []
+    while len(layer):
+        visited[layer] = True
+        layers.append(layer)
+        # Gather predecessors of all layer states at once
+        starts = indptr[layer]
+        lengths = indptr[layer + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(np.sum(lengths))
+        layer = np.unique(predecessors[offsets])
+        layer = layer[~visited[layer]]
+    if not np.all(visited):
+        layers.append(np.flatnonzero(~visited))
+    return layers
+
+
+def get_sweep_blocks(model, mode, block_size=SweepParams.BLOCK_SIZE):
+    # type: (SparseModel, str, int) -> Optional[list]
+    """
+    Get groups of states which are backed up together, groups are updated in place one after another
+    :param model: SparseModel, transition model
+    :param mode: Str, name from SweepModes
+    :param block_size: Int, amount of states in Gauss-Seidel block
+    :return: List or None, slices or np.ndarray state indexes (None for synchronous Jacobi sweep)
+    """
+    if mode == SweepModes.JACOBI:
+        return None
+    elif mode == SweepModes.GAUSS_SEIDEL:
+        return [slice(start, start + block_size) for start in range(0, model.amount_states, block_size)]
+    elif mode == SweepModes.REVERSE_TOPOLOGICAL:
+        return get_reverse_topological_layers(model)
+    else:
+        raise TypeError(f"Unknown sweep mode \"{mode}\".")
+
+
+def run_sweeps(
+        backup, V, th, policy=None, mode=SweepModes.JACOBI, blocks=None, max_iterations=None,
+        stopping=StoppingRules.DELTA, stable_sweeps=None
+):
+    # type: (BellmanBackup, np.ndarray, float, Optional[np.ndarray], str, Optional[list], Optional[int], str, Optional[int]) -> (np.ndarray, dict)
+    """
+    Repeat sweeps until change of state values in one sweep is less than threshold
+    :param backup: BellmanBackup, backup engine
+    :param V: np.ndarray, (amount states, ) initial state values
+    :param th: Float, stopping threshold
+    :param policy: np.ndarray or None, policy for expected backups (None - optimal backups, value iteration)
+    :param mode: Str, name from SweepModes
+    :param blocks: List or None, precomputed get_sweep_blocks result (reused between calls)
+    :param max_iterations: Int or None, max amount of sweeps (None - until convergence)
+    :param stopping: Str, name from StoppingRules
+    :param stable_sweeps: Int or None, also stop when greedy actions did not change for this amount of sweeps
+    (only for value iteration with Jacobi sweeps)
+    :return: (np.ndarray, dict) - state values and sweeps report
+    (mode, states, time, iterations, backups, delta, error_bound - guaranteed max norm error of returned values)
+    """
+    start_time = time.perf_counter()
+    if stopping not in (StoppingRules.DELTA, StoppingRules.SPAN):
+        raise TypeError(f"Unknown stopping rule \"{stopping}\".")
+    if mode != SweepModes.JACOBI and (stopping == StoppingRules.SPAN or stable_sweeps):
+        raise ValueError(f"Span stopping and stable policy stopping require \"{SweepModes.JACOBI}\" sweeps.")
+    if stable_sweeps and policy is not None:
+        raise ValueError("Stable policy stopping is only for value iteration (policy=None).")
+    if blocks is None:
+        blocks = get_sweep_blocks(backup.model, mode)
+    if blocks is not None:
+        # Backup engine and policy rows of every block are gathered once for all sweeps
+        blocks = [
+            (states, BellmanBackup(backup.model.subset(states), backup.gamma), None if policy is None else policy[states])
+            for states in blocks
+        ]
+    discount = backup.gamma / (1 - backup.gamma) if backup.gamma < 1 else np.inf
+    actions = None
+    stable_iterations = 0
+    iteration = 0
+    while True:
+        iteration += 1
+        prev_v = V
+        if blocks is None and stable_sweeps:
+            q = backup.q_values(prev_v)
+            V = q.max(axis=1)
+            new_actions = q.argmax(axis=1)
+            stable_iterations = stable_iterations + 1 if np.array_equal(new_actions, actions) else 0
+            actions = new_actions
+        elif blocks is None:
+            V = backup.evaluate(policy, prev_v) if policy is not None else backup.optimal(prev_v)
+        else:
+            V = prev_v.copy()
+            for states, block_backup, block_policy in blocks:
+                V[states] = block_backup.optimal(V) if policy is None else block_backup.evaluate(block_policy, V)
+        if stopping == StoppingRules.SPAN:
+            difference = V - prev_v
+            min_difference, max_difference = np.min(difference), np.max(difference)
+            delta = max_difference - min_difference
+        else:
+            delta = np.max(np.abs(V - prev_v))
+        if delta < th or iteration == max_iterations or (stable_sweeps and stable_iterations >= stable_sweeps):
+            break
+    if stopping == StoppingRules.SPAN:
+        V = V + discount * (max_difference + min_difference) / 2
+        error_bound = discount * delta / 2
+    else:
+        error_bound = discount * delta
+    return V, {
+        'mode': mode,
+        'states': backup.model.amount_states,
+        'time': time.perf_counter() - start_time,
+        'iterations': iteration,
+        'backups': iteration * backup.model.amount_states,
+        'delta': float(delta),
+        'error_bound': float(error_bound),
+    }
+
+
+def prioritized_sweeping(backup, V, th, policy=None, predecessors=None, max_backups=None):
+    # type: (BellmanBackup, np.ndarray, float, Optional[np.ndarray], Optional[tuple], Optional[int]) -> (np.ndarray, dict)
+    """
+    Back up only states which bellman error bound is above threshold, the biggest bound first
+    (change of state value by delta grows bound of every predecessor by gamma * P(state|predecessor) * |delta|,
+    bounds are summed since last backup of predecessor, so when queue is empty bellman error |T(V) - V|
+    of every state is less than threshold - the same stopping criterion as run_sweeps has)
+    :param backup: BellmanBackup, backup engine
+    :param V: np.ndarray, (amount states, ) initial state values
+    :param th: Float, bellman error threshold
+    :param policy: np.ndarray or None, policy for expected backups (None - optimal backups, value iteration)
+    :param predecessors: Tuple or None, precomputed model.get_predecessors() result (reused between calls)
+    :param max_backups: Int or None, max amount of state backups (None - until convergence)
+    :return: (np.ndarray, dict) - state values and report (mode, states, time, iterations, backups, delta, error_bound)
+    """
+    start_time = time.perf_counter()
+    model = backup.model
+    if predecessors is None:
+        predecessors = model.get_predecessors()
+    indptr, predecessor_states, predecessor_probabilities = predecessors
+    predecessor_weights = backup.gamma * predecessor_probabilities
+
+    # Bounds start from exact bellman errors (one backup of every state)
+    V = np.array(V, dtype=float)
+    priorities = np.abs((backup.optimal(V) if policy is None else backup.evaluate(policy, V)) - V)
+    is_queued = priorities >= th
+    # Heap of (-bound, state), entries with bound not equal to current bound of state are outdated
+    queue = list(zip((-priorities[is_queued]).tolist(), np.flatnonzero(is_queued).tolist()))
+    heapq.heapify(queue)
+    # Single state backups run in python on lists (numpy call per state costs more than backup itself),
+    # successors of state are converted to lists on first backup of state
+    values, priorities = V.tolist(), priorities.tolist()
+    successors = {}
+    backups = model.amount_states
+    while queue and (max_backups is None or backups < max_backups):
+        priority, state = heapq.heappop(queue)
+        if -priority != priorities[state]:
+            continue
+        if state not in successors:
+            successors[state] = (
+                model.expected_rewards[state].tolist(),
+                np.asarray(model.next_states[state]).tolist(),
+                backup.discounted_probabilities[state].tolist(),
+                None if policy is None else policy[state].tolist(),
+            )
+        expected_rewards, next_states, discounted_probabilities, action_probabilities = successors[state]
+        q = [
+            reward + sum(p * values[next_state] for p, next_state in zip(discounted_probabilities_row, next_states_row))
+            for reward, next_states_row, discounted_probabilities_row in zip(
+                expected_rewards, next_states, discounted_probabilities
+            )
+        ]
+        value = max(q) if policy is None else sum(p * q_value for p, q_value in zip(action_probabilities, q))
+        delta = abs(value - values[state])
+        values[state] = value
+        priorities[state] = 0.0
+        backups += 1
+        start, end = indptr[state], indptr[state + 1]
+        for predecessor, weight in zip(predecessor_states[start:end].tolist(), predecessor_weights[start:end].tolist()):
+            priority = priorities[predecessor] + weight * delta
+            priorities[predecessor] = priority
+            if priority >= th:
+                heapq.heappush(queue, (-priority, predecessor))
+    return np.array(values), {
+        'mode': 'prioritized',
+        'states': model.amount_states,
+        'time': time.perf_counter() - start_time,
+        'iterations': backups - model.amount_states,
+        'backups': backups,
+        'delta': max(priorities),
+        # Values are not backed up once more, so bound is residual / (1 - gamma)
+        'error_bound': max(priorities) / (1 - backup.gamma) if backup.gamma < 1 else np.inf,
+    }
+
+
+def compare_sweep_modes(model, gamma, th, policy=None, modes=None):
+    # type: (SparseModel, float, float, Optional[np.ndarray], Optional[list]) -> dict
+    """
+    Run sweeps from zero values with every mode (for choose the fastest mode for map)
+    :return: Dict, dict[mode, sweeps report]
+    """
+    backup = BellmanBackup(model, gamma)
+    reports = {}
+    for mode in modes or (SweepModes.JACOBI, SweepModes.GAUSS_SEIDEL, SweepModes.REVERSE_TOPOLOGICAL):
+        _, reports[mode] = run_sweeps(backup, np.zeros(model.amount_states), th, policy, mode)
+    return reports
@@ -2,8 +2,27 @@
 Frozen lake environment test
 """
 
+# For import planners from repository
+import os
 # For load env
 import gym
+# For check model arrays
+import numpy as np
+# For check errors
+import pytest
+
+# For generated maps
+from frozen_lake.data import Maps, MapNames, GeneratedMaps, GeneratedMapParams
+# For batched environments
+from frozen_lake.envs import VectorFrozenLake
+# For build model
+from frozen_lake.mdp import (
+    BellmanBackup, SparseModel, ModelCache, SolverNames, StoppingRules, SweepModes, get_sweep_blocks,
+    prioritized_sweeping, run_sweeps, solve_policy_values, solve_policy_values_batch
+)
+
+# Repository root (algorithms using environment are imported from its directories)
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 ####################################################################################################
@@ -38,6 +57,53 @@ def test_step_fall_env():
     env.step(0)
 
 
+def test_transition_arrays():
+    """ Test compact transition arrays keep transition matrix data """
+    env = gym.make('frozen_lake:fall-v0', map_name='medium', action_set_name='slippery')
+    for state_index, actions in env.transition_matrix.items():
+        for action_index, transfer_states in actions.items():
+            for branch_index, (probability, new_state_index, reward, done) in enumerate(transfer_states):
+                index = (state_index, action_index, branch_index)
+                assert env.transition_next_states[index] == new_state_index
+                assert env.transition_probabilities[index] == probability
+                assert env.transition_rewards[index] == reward
+                assert env.transition_dones[index] == done
+    assert np.all(env.transition_cumulative_probabilities[..., -1] == 1)
+
+
+def test_vectorized_transition_arrays():
+    """ Test vectorized transition arrays agree with per state helpers """
+    for env_name in ('default', 'fall'):
+        env = gym.make(f'frozen_lake:{env_name}-v0', map_name='large', action_set_name='slippery').unwrapped
+        for state_index in range(env.observation_space.n):
+            for action in env.action_set:
+                for branch_index, direction in enumerate(action.directions):
+                    index = (state_index, action.index, branch_index)
+                    new_state_index = env._get_next_state(state_index, direction)
+                    assert env.transition_next_states[index] == new_state_index
+                    assert env.transition_rewards[index] == env._get_state_reward(state_index, new_state_index)
+                    assert env.transition_dones[index] == env._is_round_end(new_state_index)
+
+
+####################################################################################################
+#################################### frozen lake vector test ######################################
+####################################################################################################
+
+def test_step_vector_env():
+    """ Test vector env steps all copies and resets finished ones """
+    env = gym.make('frozen_lake:default-v0', action_set_name='slippery', max_episode_size=5)
+    vector_env = VectorFrozenLake(env, amount_envs=64, seed=0)
+    states = vector_env.reset()
+    for _ in range(20):
+        new_states, rewards, dones, info = vector_env.step(np.zeros_like(states))
+        # Every transition exists in transition matrix
+        for state, reward, terminal_state in zip(states, rewards, info['terminal_states']):
+            assert (terminal_state, reward) in [(s, r) for _, s, r, _ in env.transition_matrix[state][0]]
+        assert np.all(new_states[dones] == 0)
+        assert np.all(vector_env.current_episode_sizes <= 5)
+        states = new_states
+
+
 ####################################################################################################
 ##################################### frozen lake other test #######################################
 ####################################################################################################
@@ -51,6 +117,39 @@ def test_init_maps():
     gym.make('frozen_lake:default-v0', map_name='colossal')
 
 
+def test_generated_maps(tmp_path, monkeypatch):
+    """ Test generated maps are seeded, cached on disk and have reachable goal """
+    monkeypatch.setattr(GeneratedMapParams, 'CACHE_DIR', str(tmp_path))
+    map_name = MapNames.generated(30, 40, 0.45, 7)
+    grid = Maps.get(map_name)
+    assert grid.dtype == np.uint8 and grid.shape == (30, 40)
+    assert np.array_equal(GeneratedMaps.generate(30, 40, 0.45, 7), grid)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # Goal is reachable from start by frozen states
+    env = gym.make('frozen_lake:default-v0', map_name=map_name)
+    reached, frontier = {0}, [0]
+    while frontier:
+        state_index = frontier.pop()
+        for new_state_index in env.transition_next_states[state_index].ravel().tolist():
+            if new_state_index not in reached:
+                reached.add(new_state_index)
+                frontier.append(new_state_index)
+    assert env.observation_space.n - 1 in reached
+    assert env.text_map[-1][-1] == 'G'
+    # Small hole probabilities are formatted with exponent
+    assert GeneratedMaps.parse_name(MapNames.generated(50, 50, 1e-5, 1)) == (50, 50, 1e-5, 1)
+
+
+def test_change_map():
+    """ Test map change after initialization rebuilds map params, spaces and transition arrays """
+    env = gym.make('frozen_lake:default-v0', map_name='small')
+    env.unwrapped.text_map = ["FFF", "FHG"]
+    assert env.shape == (2, 3) and env.observation_space.n == 6 and env.state_values.shape == (6, )
+    assert env.transition_next_states.shape[0] == 6 and env.transition_dones[2].any()
+    assert env.index_map[5] == (1, 2) and len(env.transition_matrix) == 6
+
+
 def test_render():
     """ Test render """
     env = gym.make('frozen_lake:default-v0')
@@ -74,3 +173,254 @@ def test_init_fix_seed_env():
     """ Test init fix seed env """
     env = gym.make('frozen_lake:default-v0')
     env.seed(1)
+
+
+####################################################################################################
+##################################### frozen lake model test #######################################
+####################################################################################################
+
+def test_sparse_model():
+    """ Test sparse model keeps transition matrix probabilities """
+    env = gym.make('frozen_lake:fall-v0', action_set_name='slippery')
+    model = SparseModel.from_env(env)
+    P, R = model.to_dense()
+    assert np.allclose(P.sum(axis=-1), 1)
+    for state_index, actions in env.transition_matrix.items():
+        for action_index, transitions in actions.items():
+            expected_reward = sum(probability * reward for probability, _, reward, _ in transitions)
+            assert np.isclose(model.expected_rewards[state_index, action_index], expected_reward)
+            assert np.isclose(np.sum(P[state_index, action_index] * R[state_index, action_index]), expected_reward)
+
+
+def test_model_cache(tmp_path):
+    """ Test model cache reuses models and invalidates them on definition change """
+    cache = ModelCache(cache_dir=str(tmp_path))
+    env = gym.make('frozen_lake:default-v0', action_set_name='slippery')
+    model = cache.get(env)
+    assert cache.get(gym.make('frozen_lake:default-v0', action_set_name='slippery')) is model
+    assert cache.get(gym.make('frozen_lake:fall-v0', action_set_name='slippery')) is not model
+
+    # Persisted model is loaded by new cache
+    cache.models.clear()
+    loaded_model = cache.get(env)
+    assert loaded_model is not model
+    assert np.array_equal(loaded_model.next_states, model.next_states)
+
+    # Changed map gives new model built from new map
+    env.unwrapped.text_map = ["FFFF", "FFFF", "FFFF", "HFFG"]
+    assert ModelCache.get_key(env) not in cache.models
+    changed_model = cache.get(env)
+    assert not np.array_equal(changed_model.dones, model.dones)
+    assert np.array_equal(changed_model.dones, SparseModel.from_env(env).dones)
+
+    # Least recently used models are dropped when models are bigger than max bytes
+    small_cache = ModelCache(max_bytes=model.nbytes)
+    small_cache.get(env)
+    fall_model = small_cache.get(gym.make('frozen_lake:fall-v0', action_set_name='slippery'))
+    assert list(small_cache.models.values()) == [fall_model]
+
+
+def test_direct_evaluation_solvers():
+    """ Test direct evaluation solvers agree with explicit inversion """
+    env = gym.make('frozen_lake:fall-v0', map_name='medium', action_set_name='slippery')
+    model = SparseModel.from_env(env)
+    policy = np.full((model.amount_states, model.amount_actions), 1 / model.amount_actions)
+    p_pi = model.policy_transitions(policy)
+    expected_v = np.linalg.inv(np.eye(model.amount_states) - 0.9 * p_pi) @ model.policy_rewards(policy)
+    for solver in (SolverNames.LU, SolverNames.SPARSE_LU, SolverNames.GMRES, SolverNames.ITERATIVE):
+        v, solver_info = solve_policy_values(model, policy, gamma=0.9, solver=solver)
+        assert solver_info['solver'] == solver
+        assert np.allclose(v, expected_v, atol=1e-7)
+
+
+def test_restricted_model():
+    """ Test optimal backup of restricted model is expected backup of deterministic policy """
+    env = gym.make('frozen_lake:fall-v0', map_name='medium', action_set_name='slippery')
+    model = SparseModel.from_env(env)
+    actions = np.random.RandomState(0).randint(model.amount_actions, size=model.amount_states)
+    policy = np.eye(model.amount_actions)[actions]
+    V = np.random.RandomState(1).uniform(size=model.amount_states)
+    restricted_backup = BellmanBackup(model.restrict(actions), gamma=0.9)
+    assert restricted_backup.model.next_states.shape == (model.amount_states, 1, model.max_branch)
+    assert np.allclose(restricted_backup.optimal(V), BellmanBackup(model, gamma=0.9).evaluate(policy, V))
+
+
+def test_modified_policy_iteration(monkeypatch):
+    """ Test modified policy iteration reaches value iteration fixed point (k=0 - value iteration from zeros) """
+    monkeypatch.syspath_prepend(os.path.join(REPOSITORY_PATH, 'model_base_policy_iteration'))
+    from policy_iteration import PolicyIteration
+    env = gym.make('frozen_lake:default-v0', map_name='small', action_set_name='slippery')
+    alg = PolicyIteration(env, gamma=0.9, eval_policy_th=1e-6)
+    backup = BellmanBackup(alg.get_mdp(), gamma=0.9)
+    optimal_v, _ = run_sweeps(backup, np.zeros(alg.count_states), th=1e-14)
+    zeros_v, sweep_info = run_sweeps(backup, np.zeros(alg.count_states), th=1e-8)
+    _, V, i = alg.modified_policy_iteration(1e-8, k=0)
+    assert np.array_equal(V, zeros_v) and i == sweep_info['iterations']
+    for k, eval_ratio in ((1, None), (5, None), (20, None), (None, 0.1)):
+        _, V, _ = alg.modified_policy_iteration(1e-8, k=k, eval_ratio=eval_ratio)
+        assert np.max(np.abs(V - optimal_v)) < 1e-8 * 0.9 / (1 - 0.9) * 1.01
+    with pytest.raises(ValueError):
+        alg.modified_policy_iteration(1e-8, k=None)
+
+
+def test_sweep_modes():
+    """ Test every sweep mode converges to the same values and in place modes back up every state once per sweep """
+    env = gym.make('frozen_lake:fall-v0', map_name='large', action_set_name='slippery')
+    model = SparseModel.from_env(env)
+    backup = BellmanBackup(model, gamma=0.9)
+    policy = np.full((model.amount_states, model.amount_actions), 1 / model.amount_actions)
+    expected_v, _ = solve_policy_values(model, policy, gamma=0.9, solver=SolverNames.LU)
+    expected_optimal_v, _ = run_sweeps(backup, np.zeros(model.amount_states), th=1e-12)
+    for mode in (SweepModes.JACOBI, SweepModes.GAUSS_SEIDEL, SweepModes.REVERSE_TOPOLOGICAL):
+        blocks = get_sweep_blocks(model, mode)
+        if blocks is not None:
+            states = np.concatenate([np.arange(model.amount_states)[block] for block in blocks])
+            assert np.array_equal(np.sort(states), np.arange(model.amount_states))
+        v, sweep_info = run_sweeps(backup, np.zeros(model.amount_states), th=1e-12, policy=policy, mode=mode)
+        assert sweep_info['mode'] == mode and sweep_info['iterations'] > 1
+        assert np.allclose(v, expected_v, atol=1e-9)
+        optimal_v, _ = run_sweeps(backup, np.zeros(model.amount_states), th=1e-12, mode=mode)
+        assert np.allclose(optimal_v, expected_optimal_v, atol=1e-9)
+
+    # Predecessor index lists exactly states with transition into state and max probability of transition
+    indptr, predecessors, probabilities = model.get_predecessors()
+    P, _ = model.to_dense()
+    for state_index in range(model.amount_states):
+        expected_predecessors = np.flatnonzero(np.any(P[:, :, state_index] > 0, axis=1))
+        assert np.array_equal(predecessors[indptr[state_index]:indptr[state_index + 1]], expected_predecessors)
+        assert np.allclose(
+            probabilities[indptr[state_index]:indptr[state_index + 1]],
+            P[expected_predecessors, :, state_index].max(axis=1)
+        )
+
+
+def test_prioritized_sweeping():
+    """ Test prioritized sweeping reaches bellman error threshold with fewer backups than value iteration """
+    env = gym.make('frozen_lake:default-v0', map_name='huge', action_set_name='slippery')
+    model = SparseModel.from_env(env)
+    backup = BellmanBackup(model, gamma=0.9)
+    V, sweep_info = run_sweeps(backup, np.zeros(model.amount_states), th=1e-8)
+    prioritized_v, prioritized_info = prioritized_sweeping(backup, np.zeros(model.amount_states), th=1e-8)
+    assert np.max(np.abs(backup.optimal(prioritized_v) - prioritized_v)) < 1e-8
+    assert prioritized_info['backups'] < sweep_info['backups'] / 2
+    # Greedy actions of both values are optimal
+    q = backup.q_values(V)
+    state_indexes = np.arange(model.amount_states)
+    assert np.allclose(q[state_indexes, backup.greedy_actions(prioritized_v)], q.max(axis=1), atol=1e-6)
+
+    # Expected backups under policy
+    policy = np.full((model.amount_states, model.amount_actions), 1 / model.amount_actions)
+    expected_v, _ = solve_policy_values(model, policy, gamma=0.9)
+    policy_v, _ = prioritized_sweeping(backup, np.zeros(model.amount_states), th=1e-10, policy=policy)
+    assert np.allclose(policy_v, expected_v, atol=1e-8)
+
+
+def test_stopping_rules():
+    """ Test every stopping rule returns values within reported error bound """
+    env = gym.make('frozen_lake:default-v0', map_name='large', action_set_name='slippery')
+    model = SparseModel.from_env(env)
+    backup = BellmanBackup(model, gamma=0.9)
+    optimal_v, _ = run_sweeps(backup, np.zeros(model.amount_states), th=1e-14)
+    for params in ({}, {'stopping': StoppingRules.SPAN}, {'stable_sweeps': 5}):
+        V, sweep_info = run_sweeps(backup, np.zeros(model.amount_states), th=1e-6, **params)
+        assert np.max(np.abs(V - optimal_v)) <= sweep_info['error_bound'] * (1 + 1e-9)
+    V, sweep_info = prioritized_sweeping(backup, np.zeros(model.amount_states), th=1e-6)
+    assert np.max(np.abs(V - optimal_v)) <= sweep_info['error_bound'] * (1 + 1e-9)
+
+    # Span stopping for policy evaluation
+    policy = np.full((model.amount_states, model.amount_actions), 1 / model.amount_actions)
+    expected_v, _ = solve_policy_values(model, policy, gamma=0.9)
+    V, sweep_info = run_sweeps(
+        backup, np.zeros(model.amount_states), th=1e-6, policy=policy, stopping=StoppingRules.SPAN
+    )
+    assert np.max(np.abs(V - expected_v)) <= sweep_info['error_bound'] * (1 + 1e-9)
+    with pytest.raises(ValueError):
+        run_sweeps(
+            backup, np.zeros(model.amount_states), th=1e-6, mode=SweepModes.GAUSS_SEIDEL, stopping=StoppingRules.SPAN
+        )
+
+
+def test_batch_evaluation():
+    """ Test batched evaluation of policies stack with many discount factors equals separate solves """
+    env = gym.make('frozen_lake:default-v0', map_name='large', action_set_name='slippery')
+    model = SparseModel.from_env(env)
+    policies = np.random.uniform(0, 1, (5, model.amount_states, model.amount_actions))
+    policies = policies / np.sum(policies, axis=2)[:, :, None]
+    gammas = np.array([0.9, 0.1, 0.5])
+    expected_values = np.array([
+        [solve_policy_values(model, policy, gamma)[0] for gamma in gammas] for policy in policies
+    ])
+    for solver in (SolverNames.LU, SolverNames.SPARSE_LU, SolverNames.BICGSTAB, SolverNames.ITERATIVE):
+        values, solver_info = solve_policy_values_batch(model, policies, gammas, solver=solver)
+        assert values.shape == (5, 3, model.amount_states)
+        assert solver_info['solver'] == solver and solver_info['residual'] < 1e-8
+        assert np.allclose(values, expected_values, atol=1e-7)
+
+
+
+####################################################################################################
+##################################### monte carlo test #############################################
+####################################################################################################
+
+def test_running_returns(monkeypatch):
+    """ Test merged running statistics equal mean and variance of all values and first visits equal brute force """
+    monkeypatch.syspath_prepend(os.path.join(REPOSITORY_PATH, 'monte_carlo'))
+    from running_returns import RunningReturns, first_visits
+    random_state = np.random.RandomState(0)
+    chunks = [(random_state.randint(5, size=size), random_state.normal(size=size)) for size in (1, 7, 50, 3, 100)]
+    returns = RunningReturns(5, track_variance=True)
+    for chunk_indexes, chunk_values in chunks:
+        returns.add_many(chunk_indexes, chunk_values)
+    indexes, values = [np.concatenate(arrays) for arrays in zip(*chunks)]
+    for index in range(5):
+        assert returns.counts[index] == np.sum(indexes == index)
+        assert np.isclose(returns.means[index], np.mean(values[indexes == index]))
+        assert np.isclose(returns.variance[index], np.var(values[indexes == index], ddof=1))
+
+    # First visits by one pass equal brute force loop
+    expected_mask = [index not in indexes[:step].tolist() for step, index in enumerate(indexes.tolist())]
+    assert np.array_equal(first_visits(indexes), expected_mask)
+
+
+def test_episode_store(monkeypatch, tmp_path):
+    """ Test episode store first visits, save and load round trip and split """
+    monkeypatch.syspath_prepend(os.path.join(REPOSITORY_PATH, 'monte_carlo'))
+    from episode_store import EpisodeStore
+    states = np.array([3, 1, 3, 3, 1, 1, 2, 1, 2, 0])
+    store = EpisodeStore(states, np.zeros(10, dtype=np.int8), np.ones(10), np.array([0, 4, 6, 10]), np.ones((4, 4)))
+    expected_mask = []
+    for episode_index in range(len(store)):
+        episode_states = store.episode(episode_index)[0].tolist()
+        expected_mask += [state not in episode_states[:step] for step, state in enumerate(episode_states)]
+    assert np.array_equal(store.get_first_visits(), expected_mask)
+    assert np.allclose(store.get_returns(0.5)[:4], [1.875, 1.75, 1.5, 1])
+
+    store.save(str(tmp_path))
+    loaded_store = EpisodeStore.load(str(tmp_path))
+    for name in EpisodeStore.ARRAY_NAMES:
+        assert np.array_equal(getattr(loaded_store, name), getattr(store, name))
+    parts = loaded_store.split(2)
+    assert [len(part) for part in parts] == [1, 2]
+    assert np.array_equal(np.concatenate([part.states for part in parts]), states)
+    assert np.array_equal(parts[1].offsets, [0, 2, 6])
+
+
+def test_weighted_importance_sampling(monkeypatch):
+    """ Test weighted importance sampling on chain equals closed form value of target policy """
+    monkeypatch.syspath_prepend(os.path.join(REPOSITORY_PATH, 'monte_carlo'))
+    from episode_store import EpisodeStore
+    from mc_evaluation import MonteCarloEvaluator
+    evaluator = MonteCarloEvaluator(gym.make('frozen_lake:default-v0'))
+    # Two states chain (state 0 -> state 1 -> end, action 0 gives reward 1, action 1 gives 0),
+    # every pair of actions once, behavior policy is uniform over actions 0 and 1
+    actions = np.array([0, 0, 0, 1, 1, 0, 1, 1], dtype=np.int8)
+    behavior_policy = np.full((16, 4), 0.25)
+    behavior_policy[:2] = [0.5, 0.5, 0, 0]
+    store = EpisodeStore(np.tile([0, 1], 4), actions, 1.0 - actions, np.arange(0, 9, 2), behavior_policy)
+    # Target policy takes rewarded action with probability p: v(1) = p, v(0) = p + gamma * p
+    p, gamma = 0.8, 0.5
+    policy = np.full((16, 4), 0.25)
+    policy[:2] = [p, 1 - p, 0, 0]
+    for first_visit in (True, False):
+        V = evaluator.weighted_importance_sampling(policy, store, gamma=gamma, first_visit=first_visit)
+        assert np.allclose(V[:2], [p + gamma * p, p])
@@ -15,6 +15,7 @@ if __name__ == "__main__":
     v1 = evaluator.direct_evaluation(policy)
     v2 = evaluator.iterative_evaluation(policy, th=0.001)
     print(v1)
+    print(evaluator.solver_info)
 
     print('_________________')
 
@@ -2,6 +2,8 @@ import time
 import numpy as np
 import gym
 from policy_iteration import PolicyIteration
+from episode_sampler import EpisodeSampler
+from running_returns import RunningReturns, discounted_returns, first_visits
 import random
 
 
@@ -16,23 +18,11 @@ class MonteCarloControl:
         self.count_action = self.env.action_space.n
         self.count_states = self.env.observation_space.n
         self.max_episode_len = max_episode_len
+        self.sampler = EpisodeSampler(env)
 
     def _get_episode(self, policy, s0=None, a0=None):
-        done = False
-        episode_history = []
-        if s0 is not None:
-            cur_state = self.env.reset(start_state_index=s0)
-            new_state_index, reward, done, _ = self.env.step(a0)
-            episode_history.append((s0, a0, reward))
-            cur_state = new_state_index
-        else:
-            cur_state = self.env.reset()
-        while not done:
-            action = np.random.choice(np.arange(self.count_action), p=policy[cur_state])
-            new_state_index, reward, done, _ = self.env.step(action)
-            episode_history.append((cur_state, action, reward))
-            cur_state = new_state_index
-        return episode_history
+        self.sampler.set_policy(policy)
+        return self.sampler.sample(s0, a0)
 
     def create_policy(self, Q, eps=0.0):
         policy = np.ones_like(Q, dtype=float)
@@ -43,36 +33,24 @@ class MonteCarloControl:
 
     def exploring_starts(self, nrof_episodes=1, gamma=0.1):
         policy = np.ones((self.env.observation_space.n, self.env.action_space.n)) / self.env.action_space.n
-        Q = np.zeros_like(policy)
-        returns = {(s, a): [] for s in range(self.count_states)
-                   for a in range(self.count_action)}
+        returns = RunningReturns(policy.shape)
+        Q = returns.means
         for e in range(nrof_episodes):
             s0, a0 = np.random.randint(self.count_states), np.random.randint(self.count_action)
-            episode = self._get_episode(policy, s0=s0, a0=a0)
-            G = 0
-            states_actions = [(i[0], i[1]) for i in episode][::-1]
-            for t, (s, a, r) in enumerate(episode[::-1]):
-                G = gamma * G + r
-                if (s, a) not in states_actions[t + 1:]:
-                    returns[(s, a)].append(G)
-                    Q[s, a] = sum(returns[(s, a)]) / len(returns[(s, a)])
+            states, actions, rewards = self._get_episode(policy, s0=s0, a0=a0)
+            first = first_visits(states * self.count_action + actions)
+            returns.add_many((states[first], actions[first]), discounted_returns(rewards, gamma)[first])
             policy = self.create_policy(Q)
         return policy
 
     def policy_control(self, nrof_episodes=1, eps=0.1, gamma=0.1):
-        Q = np.zeros((self.count_states, self.count_action))
+        returns = RunningReturns((self.count_states, self.count_action))
+        Q = returns.means
         policy = self.create_policy(Q, eps)
-        returns = {(s, a): [] for s in range(self.count_states)
-                   for a in range(self.count_action)}
         for e in range(nrof_episodes):
-            episode = self._get_episode(policy, s0=None, a0=None)
-            G = 0
-            states_actions = [(i[0], i[1]) for i in episode][::-1]
-            for t, (s, a, r) in enumerate(episode[::-1]):
-                G = gamma * G + r
-                if (s, a) not in states_actions[t + 1:]:
-                    returns[(s, a)].append(G)
-                    Q[s, a] = sum(returns[(s, a)]) / len(returns[(s, a)])
+            states, actions, rewards = self._get_episode(policy, s0=None, a0=None)
+            first = first_visits(states * self.count_action + actions)
+            returns.add_many((states[first], actions[first]), discounted_returns(rewards, gamma)[first])
             policy = self.create_policy(Q, eps)
         return policy
 
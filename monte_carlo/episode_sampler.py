@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class EpisodeSampler:
+    def __init__(self, env, max_episode_len=None, block_size=4096, capacity=1024):
+        self.env = env
+        self.count_action = env.action_space.n
+        self.max_episode_len = max_episode_len
+        self.block_size = block_size
+        self.cumulative_policy = None
+        self.random_values = []
+        self.position = 0
+        self.states = np.empty(capacity, dtype=np.int32)
+        self.actions = np.empty(capacity, dtype=np.int32)
+        self.rewards = np.empty(capacity, dtype=np.float32)
+
+    def set_policy(self, policy):
+        cumulative_policy = np.cumsum(policy, axis=1)
+        self.cumulative_policy = (cumulative_policy / cumulative_policy[:, -1:]).ravel()
+
+    def reset_random_values(self):
+        self.random_values = []
+        self.position = 0
+
+    def _grow(self):
+        self.states = np.concatenate([self.states, np.empty_like(self.states)])
+        self.actions = np.concatenate([self.actions, np.empty_like(self.actions)])
+        self.rewards = np.concatenate([self.rewards, np.empty_like(self.rewards)])
+
+    def sample(self, s0=None, a0=None):
+        cumulative_policy = self.cumulative_policy
+        random_values, position = self.random_values, self.position
+        i = 0
+        done = False
+        if s0 is not None:
+            self.env.reset(start_state_index=s0)
+            cur_state, reward, done, _ = self.env.step(a0)
+            self.states[0], self.actions[0], self.rewards[0] = s0, a0, reward
+            i = 1
+        else:
+            cur_state = self.env.reset()
+        while not done:
+            if position == len(random_values):
+                random_values, position = np.random.random(self.block_size).tolist(), 0
+            random_value = random_values[position]
+            position += 1
+            first_index = index = cur_state * self.count_action
+            while random_value >= cumulative_policy.item(index):
+                index += 1
+            action = index - first_index
+            new_state_index, reward, done, _ = self.env.step(action)
+            if i == len(self.states):
+                self._grow()
+            self.states[i], self.actions[i], self.rewards[i] = cur_state, action, reward
+            cur_state = new_state_index
+            i += 1
+            if self.max_episode_len is not None and i > self.max_episode_len:
+                break
+        self.random_values, self.position = random_values, position
+        return self.states[:i], self.actions[:i], self.rewards[:i]
@@ -0,0 +1,78 @@
+import os
+import numpy as np
+from running_returns import discounted_returns, first_visits
+
+
+class EpisodeStore:
+    ARRAY_NAMES = ('states', 'actions', 'rewards', 'offsets', 'policy')
+
+    def __init__(self, states, actions, rewards, offsets, policy):
+        self.states = states
+        self.actions = actions
+        self.rewards = rewards
+        self.offsets = offsets
+        self.policy = policy
+        self.returns = {}
+
+    @classmethod
+    def collect(cls, sampler, policy, count_episodes):
+        sampler.set_policy(policy)
+        sampler.reset_random_values()
+        episodes = [[array.copy() for array in sampler.sample()] for _ in range(count_episodes)]
+        states, actions, rewards = [np.concatenate(arrays) for arrays in zip(*episodes)]
+        offsets = np.zeros(count_episodes + 1, dtype=np.int64)
+        np.cumsum([len(episode_states) for episode_states, _, _ in episodes], out=offsets[1:])
+        return cls(states, actions.astype(np.int8), rewards, offsets, np.asarray(policy, dtype=float))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def episode(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.states[start:end], self.actions[start:end], self.rewards[start:end]
+
+    def select(self, start, end):
+        offsets = np.asarray(self.offsets[start:end + 1])
+        steps = slice(offsets[0], offsets[-1])
+        return EpisodeStore(self.states[steps], self.actions[steps], self.rewards[steps], offsets - offsets[0], self.policy)
+
+    def split(self, count):
+        bounds = np.linspace(0, len(self), count + 1).astype(int)
+        return [self.select(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def _episode_slices(self):
+        offsets = np.asarray(self.offsets).tolist()
+        return [slice(start, end) for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def get_returns(self, gamma):
+        if gamma not in self.returns:
+            returns = np.empty(len(self.rewards))
+            for steps in self._episode_slices():
+                returns[steps] = discounted_returns(self.rewards[steps], gamma)
+            self.returns[gamma] = returns
+        return self.returns[gamma]
+
+    def get_first_visits(self):
+        states = np.asarray(self.states)
+        mask = np.empty(len(states), dtype=bool)
+        first_steps = np.full(self.policy.shape[0], np.iinfo(np.int64).max)
+        for steps in self._episode_slices():
+            mask[steps] = first_visits(states[steps], first_steps)
+        return mask
+
+    def get_importance_ratios(self, policy):
+        states, actions = np.asarray(self.states), np.asarray(self.actions)
+        step_ratios = policy[states, actions] / self.policy[states, actions]
+        ratios = np.empty(len(step_ratios))
+        for steps in self._episode_slices():
+            ratios[steps] = np.cumprod(step_ratios[steps][::-1])[::-1]
+        return ratios
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        return cls(*[np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in cls.ARRAY_NAMES])
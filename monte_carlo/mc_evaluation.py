@@ -1,112 +1,156 @@
 import time
+import multiprocessing
 import numpy as np
 import gym
+from frozen_lake.mdp import SolverNames, get_model, solve_policy_values, solve_policy_values_batch
+from episode_sampler import EpisodeSampler
+from episode_store import EpisodeStore
+from running_returns import RunningReturns, discounted_returns, first_visits
 
 
 class DirectEvaluator:
-    def __init__(self, env):
+    def __init__(self, env, model=None, gamma=0.1):
         self.env = env
+        self.model = model
         self.count_action = len(self.env.action_set)
-        self.gamma = 0.1
-        self.count_states = len(self.env.transition_matrix)
+        self.gamma = gamma
+        self.count_states = self.env.observation_space.n
+        self.solver_info = None
 
     def get_mdp(self):
-        P = np.zeros((self.count_states, self.count_action, self.count_states))
-        R = np.zeros((self.count_states, self.count_action, self.count_states))
-        for state in self.env.transition_matrix.keys():
-            for action_ind, cond_probs in self.env.transition_matrix[state].items():
-                for prob in cond_probs:
-                    next_state_prob, next_state, reward = prob[0], prob[1], prob[2]
-                    P[state, action_ind, next_state] += next_state_prob
-                    R[state, action_ind, next_state] += reward
-        return P, R
-
-    def __call__(self, policy):
-        p, r = self.get_mdp()
-        p_pi = np.zeros((self.count_states, self.count_states))
-        for s in range(self.count_states):
-            p_pi[s] = policy[s] @ p[s]
-
-        r_sa = np.sum(p * r, axis=-1)
-        r_pi = np.zeros(self.count_states)
-        for s in range(self.count_states):
-            r_pi[s] = policy[s] @ r_sa[s]
-        v = np.linalg.inv(np.eye(p_pi.shape[0]) - self.gamma * p_pi) @ r_pi
+        if self.model is None:
+            self.model = get_model(self.env)
+        return self.model
+
+    def __call__(self, policy, solver=SolverNames.AUTO, x0=None):
+        v, self.solver_info = solve_policy_values(self.get_mdp(), policy, self.gamma, solver=solver, x0=x0)
         return v
 
+    def batch_evaluation(self, policies, gammas=None, solver=SolverNames.AUTO):
+        gammas = [self.gamma] if gammas is None else gammas
+        values, self.solver_info = solve_policy_values_batch(self.get_mdp(), policies, gammas, solver=solver)
+        return values
+
 
 class MonteCarloEvaluator:
     def __init__(self, env, max_episode_len=1000):
         self.env = env
         self.count_action = len(self.env.action_set)
-        self.count_states = len(self.env.transition_matrix)
+        self.count_states = self.env.observation_space.n
         self.max_episode_len = max_episode_len
+        self.returns = None
+        self.sampler = EpisodeSampler(env, max_episode_len)
+
+    def collect(self, policy, count_episodes=1500):
+        return EpisodeStore.collect(self.sampler, policy, count_episodes)
+
+    def _stream_returns(self, policy, gamma, first_visit, count_episodes=1500):
+        self.sampler.set_policy(policy)
+        self.sampler.reset_random_values()
+        for _ in range(count_episodes):
+            states, _, rewards = self.sampler.sample()
+            returns = discounted_returns(rewards, gamma)
+            if first_visit:
+                first = first_visits(states)
+                states, returns = states[first], returns[first]
+            self.returns.add_many(states, returns)
+
+    def every_visit_evaluation(self, policy, gamma=0.1, track_variance=False, store=None):
+        self.returns = RunningReturns(self.count_states, track_variance)
+        if store is None:
+            self._stream_returns(policy, gamma, first_visit=False)
+        else:
+            self.returns.add_many(store.states, store.get_returns(gamma))
+        return self.returns.means.copy()
 
-    def _get_episode(self, policy):
-        done = False
-        cur_state = self.env.reset()
-        episode_history = []
-        i = 0
-        while not done:
-            action = np.random.choice(np.arange(4), p=policy[cur_state])
-            new_state_index, reward, done, _ = self.env.step(action)
-            episode_history.append((cur_state, action, reward))
-            cur_state = new_state_index
-            i += 1
-            if i > self.max_episode_len:
-                break
-        return episode_history
-
-    def every_visit_evaluation(self, policy, gamma=0.1):
-        V = np.zeros(self.count_states)
-        returns = {s: [] for s in range(self.count_states)}
-        for i in range(1500):
-            episode = self._get_episode(policy)
-            G = 0
-            for s, a, r in episode[::-1]:
-                G = gamma * G + r
-                returns[s].append(G)
-        for s in range(self.count_states):
-            if returns[s]:
-                V[s] = np.mean(returns[s])
-
-        return V
-
-    def first_visit_evaluation(self, policy, gamma=0.1):
-        V = np.zeros(self.count_states)
-        returns = {s: [] for s in range(self.count_states)}
-        for i in range(1500):
-            episode = self._get_episode(policy)
-            G = 0
-            states = [i[0] for i in episode][::-1]
-            for t, (s, a, r) in enumerate(episode[::-1]):
-                G = gamma * G + r
-                if s not in states[t + 1:]:
-                    returns[s].append(G)
-        for s in range(self.count_states):
-            if returns[s]:
-                V[s] = np.mean(returns[s])
-
-        return V
-
-
-def get_bias_variance(count_runs, env, policy, max_episode_len, eval_type):
-    d_eval = DirectEvaluator(env=env)
-    v_direct = d_eval(policy)
-    eval_module = MonteCarloEvaluator(env=env, max_episode_len=max_episode_len)
-    v_exps = []
-    for i in range(count_runs):
-        if eval_type == 'first_visit':
-            v = eval_module.first_visit_evaluation(policy=policy)
+    def first_visit_evaluation(self, policy, gamma=0.1, track_variance=False, store=None):
+        self.returns = RunningReturns(self.count_states, track_variance)
+        if store is None:
+            self._stream_returns(policy, gamma, first_visit=True)
         else:
-            v = eval_module.every_visit_evaluation(policy=policy)
-        v_exps.append(v)
-    v_exps = np.vstack(v_exps)
+            first = store.get_first_visits()
+            self.returns.add_many(store.states[first], store.get_returns(gamma)[first])
+        return self.returns.means.copy()
+
+    def weighted_importance_sampling(self, policy, store, gamma=0.1, first_visit=True):
+        ratios = store.get_importance_ratios(policy)
+        returns = store.get_returns(gamma)
+        visits = store.get_first_visits() if first_visit else slice(None)
+        states = store.states[visits]
+        weights = np.bincount(states, weights=ratios[visits], minlength=self.count_states)
+        weighted_returns = np.bincount(states, weights=(ratios * returns)[visits], minlength=self.count_states)
+        v = np.zeros(self.count_states)
+        np.divide(weighted_returns, weights, out=v, where=weights > 0)
+        return v
+
+
+_worker = {}
+
+
+def _init_worker(env, policy):
+    _worker['env'] = env
+    _worker['policy'] = policy
+    _worker['evaluators'] = {}
+
+
+def _run_evaluation(task):
+    max_episode_len, eval_type, seed_sequence = task
+    evaluators = _worker['evaluators']
+    if max_episode_len not in evaluators:
+        evaluators[max_episode_len] = MonteCarloEvaluator(env=_worker['env'], max_episode_len=max_episode_len)
+    eval_module = evaluators[max_episode_len]
+    np_seed, env_seed = seed_sequence.generate_state(2)
+    np.random.seed(np_seed)
+    eval_module.env.seed(int(env_seed))
+    if eval_type == 'first_visit':
+        return eval_module.first_visit_evaluation(policy=_worker['policy'])
+    return eval_module.every_visit_evaluation(policy=_worker['policy'])
+
+
+def _bias_variance(v_direct, v_exps):
     bias = np.linalg.norm(v_direct - v_exps, axis=1, ord=2).mean()
     variance = np.linalg.norm(np.mean(np.power(v_exps, 2), axis=0) - np.power(np.mean(v_exps, axis=0), 2), ord=2)
     return bias, variance
 
 
+def get_bias_variance_sweep(count_runs, env, policy, max_episode_lens, eval_types, processes=None, seed=None):
+    d_eval = DirectEvaluator(env=env)
+    v_direct = d_eval(policy)
+    if seed is None:
+        seed = np.random.randint(2 ** 32)
+    configs = [(max_episode_len, eval_type) for max_episode_len in max_episode_lens for eval_type in eval_types]
+    tasks = [
+        (max_episode_len, eval_type, seed_sequence)
+        for (max_episode_len, eval_type), config_seed in zip(configs, np.random.SeedSequence(seed).spawn(len(configs)))
+        for seed_sequence in config_seed.spawn(count_runs)
+    ]
+    processes = processes or multiprocessing.cpu_count()
+    if processes == 1:
+        _init_worker(env, policy)
+        v_exps = [_run_evaluation(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(env, policy)) as pool:
+            v_exps = pool.map(_run_evaluation, tasks, chunksize=max(1, len(tasks) // (4 * processes)))
+    v_exps = np.array(v_exps).reshape(len(configs), count_runs, -1)
+    return {config: _bias_variance(v_direct, config_v_exps) for config, config_v_exps in zip(configs, v_exps)}
+
+
+def get_bias_variance_from_store(store, env, policy, count_runs, eval_type):
+    d_eval = DirectEvaluator(env=env)
+    v_direct = d_eval(policy)
+    eval_module = MonteCarloEvaluator(env=env)
+    if eval_type == 'first_visit':
+        evaluate = eval_module.first_visit_evaluation
+    else:
+        evaluate = eval_module.every_visit_evaluation
+    v_exps = np.array([evaluate(policy, store=run_store) for run_store in store.split(count_runs)])
+    return _bias_variance(v_direct, v_exps)
+
+
+def get_bias_variance(count_runs, env, policy, max_episode_len, eval_type, processes=None, seed=None):
+    results = get_bias_variance_sweep(count_runs, env, policy, [max_episode_len], [eval_type], processes, seed)
+    return results[(max_episode_len, eval_type)]
+
 
 if __name__ == '__main__':
     np.random.seed(0)
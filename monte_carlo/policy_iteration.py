@@ -1,90 +1,120 @@
+import time
 import numpy as np
 import gym
+from frozen_lake.mdp import BellmanBackup, StoppingRules, SweepModes, get_model, get_sweep_blocks, prioritized_sweeping, run_sweeps
 
 
 class PolicyIteration:
-    def __init__(self, env, gamma, eval_policy_th):
+    def __init__(self, env, gamma, eval_policy_th, model=None):
         self.env = env
+        self.model = model
         self.count_action = len(self.env.action_set)
         self.gamma = gamma
         self.eval_th = eval_policy_th
-        self.count_states = len(self.env.transition_matrix)
+        self.count_states = self.env.observation_space.n
+        self.sweep_blocks = {}
+        self.predecessors = None
+        self.sweep_info = None
+        self.backups = 0
 
     def get_mdp(self):
-        P = np.zeros((self.count_states, self.count_action, self.count_states))
-        R = np.zeros((self.count_states, self.count_action, self.count_states))
-        for state in self.env.transition_matrix.keys():
-            for action_ind, cond_probs in self.env.transition_matrix[state].items():
-                for prob in cond_probs:
-                    next_state_prob, next_state, reward = prob[0], prob[1], prob[2]
-                    P[state, action_ind, next_state] += next_state_prob
-                    R[state, action_ind, next_state] += reward
-        return P, R
-
-    def iterative_evaluation(self, policy, th=0.001):
-        p, r = self.get_mdp()
-        V = np.zeros(self.count_states)
-        while True:
-            delta = 0
-            prev_v = V.copy()
-            for s in range(self.count_states):
-                v = prev_v[s]
-                v2_ = np.sum(policy[s] @ (p[s] * (r[s] + self.gamma * prev_v)))
-                V[s] = v2_
-                delta = max(delta, abs(v - V[s]))
-            if delta < th:
-                break
+        if self.model is None:
+            self.model = get_model(self.env)
+        return self.model
+
+    def get_sweep_blocks(self, sweep_mode):
+        if sweep_mode not in self.sweep_blocks:
+            self.sweep_blocks[sweep_mode] = get_sweep_blocks(self.get_mdp(), sweep_mode)
+        return self.sweep_blocks[sweep_mode]
+
+    def iterative_evaluation(self, policy, th=0.001, sweep_mode=SweepModes.JACOBI, stopping=StoppingRules.DELTA):
+        backup = BellmanBackup(self.get_mdp(), self.gamma)
+        V, self.sweep_info = run_sweeps(
+            backup, np.zeros(self.count_states), th, policy, sweep_mode, self.get_sweep_blocks(sweep_mode),
+            stopping=stopping
+        )
         return V
 
-    def policy_iteration(self):
+    def policy_iteration(self, sweep_mode=SweepModes.JACOBI):
         policy = np.random.uniform(0, 1, (self.count_states, self.count_action))
         policy = policy / np.sum(policy, axis=1)[:, None]
+        backups = 0
         i = 0
         while True:
             i += 1
-            V = self.iterative_evaluation(policy, self.eval_th)
-            p, r = self.get_mdp()
-            policy_stable = True
-            for s in range(self.count_states):
-                old_action = policy[s].argmax()
-                values = []
-                for a in range(self.count_action):
-                    values.append(np.sum(p[s, a] * (r[s, a] + self.gamma * V)))
-                t = np.argmax(values)
-                policy[s] = np.zeros_like(policy[s])
-                policy[s, t] = 1
-                if old_action != t:
-                    policy_stable = False
+            V = self.iterative_evaluation(policy, self.eval_th, sweep_mode)
+            backups += self.sweep_info['backups'] + self.count_states
+            backup = BellmanBackup(self.get_mdp(), self.gamma)
+            old_actions = policy.argmax(axis=1)
+            policy = backup.greedy_policy(V, current_actions=old_actions)
+            policy_stable = np.array_equal(policy.argmax(axis=1), old_actions)
             if policy_stable:
                 break
+        self.backups = backups
         return policy, V, i
 
-    def value_iteration(self, th):
-        V = np.random.uniform(0, 1, self.count_states)
-        p, r = self.get_mdp()
+    def modified_policy_iteration(self, th, k=5, eval_ratio=None, sweep_mode=SweepModes.JACOBI):
+        if k is None and eval_ratio is None:
+            raise ValueError("Evaluation without sweeps cap (k=None) requires eval_ratio.")
+        V = np.zeros(self.count_states)
+        backup = BellmanBackup(self.get_mdp(), self.gamma)
+        blocks = self.get_sweep_blocks(sweep_mode)
+        backups = 0
         i = 0
         while True:
-            delta = 0
             i += 1
-            prev_v = V.copy()
-            for s in range(self.count_states):
-                v = V[s]
-                values = []
-                for a in range(self.count_action):
-                    values.append(np.sum(p[s, a] * (r[s, a] + self.gamma * prev_v)))
-                V[s] = np.max(values)
-                delta = max(delta, abs(v - V[s]))
+            q = backup.q_values(V)
+            prev_v = V
+            V = q.max(axis=1)
+            backups += self.count_states
+            delta = np.max(np.abs(V - prev_v))
             if delta < th:
                 break
-        policy = np.zeros((self.env.observation_space.n, self.env.action_space.n))
-        for s in range(self.count_states):
-            values = []
-            for a in range(self.count_action):
-                values.append(np.sum(p[s, a] * (r[s, a] + self.gamma * V)))
-            t = np.argmax(values)
-            policy[s, t] = 1
+            if k is None or k > 0:
+                policy_backup = BellmanBackup(self.get_mdp().restrict(q.argmax(axis=1)), self.gamma)
+                eval_th = 0.0 if eval_ratio is None else eval_ratio * delta
+                V, self.sweep_info = run_sweeps(policy_backup, V, eval_th, None, sweep_mode, blocks, k)
+                backups += self.sweep_info['backups']
+        self.backups = backups
+        policy = backup.greedy_policy(V)
         return policy, V, i
 
+    def value_iteration(self, th, sweep_mode=SweepModes.JACOBI, stopping=StoppingRules.DELTA, stable_sweeps=None):
+        V = np.random.uniform(0, 1, self.count_states)
+        backup = BellmanBackup(self.get_mdp(), self.gamma)
+        V, self.sweep_info = run_sweeps(
+            backup, V, th, None, sweep_mode, self.get_sweep_blocks(sweep_mode),
+            stopping=stopping, stable_sweeps=stable_sweeps
+        )
+        self.backups = self.sweep_info['backups']
+        policy = backup.greedy_policy(V)
+        return policy, V, self.sweep_info['iterations']
+
+    def prioritized_value_iteration(self, th):
+        V = np.zeros(self.count_states)
+        backup = BellmanBackup(self.get_mdp(), self.gamma)
+        if self.predecessors is None:
+            self.predecessors = self.get_mdp().get_predecessors()
+        V, self.sweep_info = prioritized_sweeping(backup, V, th, predecessors=self.predecessors)
+        self.backups = self.sweep_info['backups']
+        policy = backup.greedy_policy(V)
+        return policy, V, self.sweep_info['iterations']
+
+    def compare_backups(self, th, ks=(0, 1, 5, 20)):
+        planners = {
+            'policy_iteration': lambda: self.policy_iteration(),
+            'value_iteration': lambda: self.value_iteration(th),
+            'prioritized_value_iteration': lambda: self.prioritized_value_iteration(th),
+        }
+        for k in ks:
+            planners[f'modified_policy_iteration_k{k}'] = lambda k=k: self.modified_policy_iteration(th, k)
+        results = {}
+        for name, planner in planners.items():
+            start_time = time.perf_counter()
+            _, _, i = planner()
+            results[name] = {'iterations': i, 'backups': self.backups, 'time': time.perf_counter() - start_time}
+        return results
+
 
 def show_policy_game_board(policy, env_shape):
     p = policy.argmax(axis=1)
@@ -104,3 +134,17 @@ if __name__ == "__main__":
 
     p, v, i = alg.value_iteration(th=0.00001)
     print(i)
+
+    for sweep_mode in (SweepModes.JACOBI, SweepModes.GAUSS_SEIDEL, SweepModes.REVERSE_TOPOLOGICAL):
+        alg.value_iteration(th=0.00001, sweep_mode=sweep_mode)
+        print(sweep_mode, alg.sweep_info['iterations'], alg.sweep_info['time'])
+
+    for stopping, stable_sweeps in ((StoppingRules.DELTA, None), (StoppingRules.SPAN, None), (StoppingRules.DELTA, 5)):
+        alg.value_iteration(th=0.00001, stopping=stopping, stable_sweeps=stable_sweeps)
+        print(stopping, stable_sweeps, alg.sweep_info['iterations'], alg.sweep_info['error_bound'])
+
+    p, v, i = alg.prioritized_value_iteration(th=0.00001)
+    print(i, alg.sweep_info['backups'], alg.sweep_info['time'])
+
+    for name, result in alg.compare_backups(th=0.00001).items():
+        print(name, result)
@@ -0,0 +1,69 @@
+import numpy as np
+
+try:
+    from scipy.signal import lfilter
+except ImportError:
+    lfilter = None
+
+
+def discounted_returns(rewards, gamma):
+    rewards = np.asarray(rewards, dtype=float)
+    if lfilter is not None:
+        return lfilter([1.0], [1.0, -gamma], rewards[::-1])[::-1]
+    returns = np.empty_like(rewards)
+    G = 0.0
+    for t in range(len(rewards) - 1, -1, -1):
+        G = gamma * G + rewards[t]
+        returns[t] = G
+    return returns
+
+
+def first_visits(indexes, first_steps=None):
+    indexes = np.asarray(indexes)
+    steps = np.arange(len(indexes))
+    if first_steps is None:
+        first_steps = np.full(int(np.max(indexes, initial=-1)) + 1, np.iinfo(np.int64).max)
+    np.minimum.at(first_steps, indexes, steps)
+    mask = first_steps[indexes] == steps
+    first_steps[indexes] = np.iinfo(np.int64).max
+    return mask
+
+
+class RunningReturns:
+    def __init__(self, shape, track_variance=False):
+        self.counts = np.zeros(shape, dtype=np.int64)
+        self.means = np.zeros(shape)
+        self.track_variance = track_variance
+        self.m2 = np.zeros(shape) if track_variance else None
+
+    def _group(self, indexes):
+        size = self.means.size
+        if size <= 4 * len(indexes):
+            batch_counts = np.bincount(indexes, minlength=size)
+            visited = batch_counts > 0
+            return np.flatnonzero(visited), (np.cumsum(visited) - 1)[indexes], batch_counts[visited]
+        return np.unique(indexes, return_inverse=True, return_counts=True)
+
+    def add_many(self, indexes, values):
+        if isinstance(indexes, tuple):
+            indexes = np.ravel_multi_index(indexes, self.means.shape)
+        values = np.asarray(values, dtype=float)
+        unique_indexes, inverse, batch_counts = self._group(indexes)
+        batch_means = np.bincount(inverse, weights=values) / batch_counts
+        counts, means = self.counts.reshape(-1), self.means.reshape(-1)
+        old_counts = counts[unique_indexes]
+        new_counts = old_counts + batch_counts
+        delta = batch_means - means[unique_indexes]
+        means[unique_indexes] += delta * batch_counts / new_counts
+        if self.track_variance:
+            batch_m2 = np.bincount(inverse, weights=(values - batch_means[inverse]) ** 2)
+            self.m2.reshape(-1)[unique_indexes] += batch_m2 + delta ** 2 * old_counts * batch_counts / new_counts
+        counts[unique_indexes] = new_counts
+
+    @property
+    def variance(self):
+        if not self.track_variance:
+            raise ValueError('Variance is not tracked, use track_variance=True.')
+        variance = np.zeros_like(self.m2)
+        np.divide(self.m2, self.counts - 1, out=variance, where=self.counts > 1)
+        return variance